@@ -0,0 +1,240 @@
+# benchmark.py: Mede o desempenho das procuras de takuzu.py sobre os testes
+# do enunciado e sobre tabuleiros maiores gerados, e compara os resultados
+# com os de uma execução anterior.
+#
+# Por exemplo:
+#   $ python3 benchmark.py --output baseline.json
+#   $ python3 benchmark.py --baseline baseline.json --output report.csv
+
+import argparse
+import csv
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from search import BudgetExceeded, InstrumentedProblem, SearchBudget
+from takuzu import (
+    BOARD_BACKENDS,
+    SEARCH_STRATEGIES,
+    Takuzu,
+    generate_puzzle,
+    read_instances,
+)
+
+
+FIELDS = ["instance", "side", "search", "status", "time", "nodes", "states",
+          "goal_tests", "max_depth", "peak_frontier", "peak_memory"]
+
+
+def load_instances(path: str, board_class, sizes: list, generated: int, seed: int):
+    """Devolve uma lista de (nome, tabuleiro, solução esperada ou None) com
+    as instâncias de path (diretoria ou zip, ver read_instances) e, para
+    cada tamanho de sizes, generated puzzles gerados com 40% das células
+    preenchidas. As sementes são fixas, por isso os puzzles gerados são os
+    mesmos em todas as execuções."""
+    instances = []
+    for name, data, expected in read_instances(path):
+        board = board_class.parse_instance(data.decode())
+        solution = None
+        if (expected is not None):
+            solution = board_class.parse_instance(b"%d\n" % board.side + expected)
+        instances.append((name, board, solution))
+
+    for side in sizes:
+        for index in range(generated):
+            puzzle, solution, _ = generate_puzzle(side, clues=side * side * 2 // 5,
+                                                  seed=seed + index, board_class=board_class)
+            instances.append(("generated_{}x{}_{}".format(side, side, index), puzzle, solution))
+    return instances
+
+
+def run_search(board, search: str, timeout: float, measure_memory: bool):
+    """Resolve o tabuleiro com a procura search, sobre um InstrumentedProblem.
+    O tempo inclui a propagação inicial feita pelo construtor de Takuzu.
+    Retorna (problema instrumentado, nó solução ou None, tempo, pico de
+    memória em bytes ou None, True se o tempo acabou)."""
+    if (measure_memory):
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    problem = InstrumentedProblem(Takuzu(board))
+    node = SEARCH_STRATEGIES[search](problem, budget=SearchBudget(timeout=timeout))
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if (measure_memory):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    timed_out = isinstance(node, BudgetExceeded)
+    return problem, None if timed_out else node, elapsed, peak, timed_out
+
+
+def check_result(board, node, expected) -> str:
+    """Verifica a solução encontrada: tem de respeitar as regras, manter as
+    pistas do tabuleiro e, se houver, ser igual à solução esperada"""
+    if (node is None):
+        return "no solution"
+
+    matrix = node.state.board.to_array()
+    clues = board.to_array() != 2
+    if (not Takuzu.is_solution(matrix) or
+        not np.array_equal(matrix[clues], board.to_array()[clues])):
+        return "invalid"
+    if (expected is not None and not np.array_equal(matrix, expected.to_array())):
+        return "diff"
+    return "ok"
+
+
+def run_benchmark(instances: list, searches: list, repeat: int = 3, timeout: float = 30,
+                  measure_memory: bool = True, report=sys.stderr) -> list:
+    """Corre cada procura sobre cada instância. O tempo é a mediana de
+    repeat execuções, que varia menos entre corridas do que a mais rápida;
+    o pico de memória é medido numa execução à parte, com tracemalloc, para
+    não afetar os tempos. Retorna uma lista de dicionários com os campos de
+    FIELDS; os que não foram medidos ficam a None."""
+    results = []
+    for name, board, expected in instances:
+        for search in searches:
+            times = []
+            for _ in range(repeat):
+                problem, node, elapsed, _, timed_out = run_search(board, search, timeout, False)
+                times.append(elapsed)
+                if (timed_out):
+                    break
+
+            status = "timeout" if timed_out else check_result(board, node, expected)
+            peak = None
+            if (measure_memory and not timed_out):
+                peak = run_search(board, search, timeout, True)[3]
+
+            result = {"instance": name, "side": board.side, "search": search,
+                      "status": status, "time": statistics.median(times),
+                      "nodes": problem.succs, "states": problem.states,
+                      "goal_tests": problem.goal_tests, "max_depth": problem.max_depth,
+                      "peak_frontier": problem.peak_frontier, "peak_memory": peak}
+            # A procura inplace (Takuzu.solve_inplace) trabalha sobre o
+            # Takuzu e não passa pelos métodos do problema instrumentado:
+            # os estados expandidos vêm de Takuzu.expansions e o resto não
+            # foi medido.
+            if (search == "inplace"):
+                result.update(nodes=getattr(problem.problem, "expansions", 0), states=None,
+                              goal_tests=None, max_depth=None, peak_frontier=None)
+            results.append(result)
+            print("{instance}\t{search}\t{status}\t{time:.4f}s\t{nodes} nodes".format(**result),
+                  file=report)
+    return results
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float,
+                          min_difference: float) -> list:
+    """Compara os resultados com os de uma execução anterior. Devolve uma
+    lista de mensagens com as regressões: casos que deixaram de estar
+    corretos, que expandem mais estados ou cujo tempo cresceu mais do que
+    tolerance (em fração) e do que min_difference segundos."""
+    previous = {(result["instance"], result["search"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["instance"], result["search"]))
+        if (old is None):
+            continue
+
+        case = "{} {}".format(result["instance"], result["search"])
+        if (old["status"] == "ok" and result["status"] != "ok"):
+            regressions.append("{}: status {} -> {}".format(case, old["status"], result["status"]))
+        if (result["nodes"] > old["nodes"]):
+            regressions.append("{}: nodes {} -> {}".format(case, old["nodes"], result["nodes"]))
+        if (result["time"] > old["time"] * (1 + tolerance) and
+            result["time"] - old["time"] > min_difference):
+            regressions.append("{}: time {:.4f}s -> {:.4f}s".format(case, old["time"],
+                                                                     result["time"]))
+    return regressions
+
+
+def write_report(path: str, results: list):
+    """Escreve os resultados em CSV, se path acabar em .csv, ou em JSON"""
+    if (path.endswith(".csv")):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        metadata = {"python": platform.python_version(), "numpy": np.__version__,
+                    "machine": platform.machine(), "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(path, "w") as file:
+            json.dump({"metadata": metadata, "results": results}, file, indent=1)
+
+
+def read_report(path: str) -> list:
+    """Lê os resultados escritos por write_report"""
+    if (path.endswith(".csv")):
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        for row in rows:
+            row["time"] = float(row["time"])
+            row["nodes"] = int(row["nodes"])
+        return rows
+
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o desempenho das procuras de takuzu.py.")
+    parser.add_argument("--instances", default="testes-takuzu.zip", metavar="DIR|ZIP",
+                        help="instâncias input_*/output_* (default: testes-takuzu.zip)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[20, 30],
+                        help="tamanhos dos tabuleiros gerados (default: 20 30)")
+    parser.add_argument("--generated", type=int, default=2,
+                        help="número de tabuleiros gerados por tamanho (default: 2)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="semente do primeiro tabuleiro gerado (default: 0)")
+    parser.add_argument("--search", nargs="*", choices=sorted(SEARCH_STRATEGIES),
+                        default=sorted(SEARCH_STRATEGIES),
+                        help="procuras a medir (default: todas)")
+    parser.add_argument("--backend", choices=sorted(BOARD_BACKENDS), default="bits",
+                        help="representação interna do tabuleiro (default: bits)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="execuções por caso; conta a mediana (default: 3)")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="tempo máximo de cada execução, em segundos (default: 30)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="não mede o pico de memória")
+    parser.add_argument("--output", metavar="FILE",
+                        help="ficheiro .json ou .csv onde escrever os resultados")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="resultados anteriores com que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="aumento relativo do tempo tolerado (default: 0.25)")
+    parser.add_argument("--min-difference", type=float, default=0.01,
+                        help="aumento do tempo, em segundos, abaixo do qual não há "
+                             "regressão (default: 0.01)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    instances = load_instances(args.instances, BOARD_BACKENDS[args.backend], args.sizes,
+                               args.generated, args.seed)
+    results = run_benchmark(instances, args.search, args.repeat, args.timeout,
+                            not args.no_memory)
+    if (args.output):
+        write_report(args.output, results)
+
+    failures = [result for result in results if result["status"] not in ("ok", "timeout")]
+    for result in failures:
+        print("FAILED: {instance} {search} {status}".format(**result), file=sys.stderr)
+
+    regressions = []
+    if (args.baseline):
+        regressions = compare_with_baseline(results, read_report(args.baseline),
+                                            args.tolerance, args.min_difference)
+        for regression in regressions:
+            print("REGRESSION: " + regression, file=sys.stderr)
+
+    sys.exit(1 if failures or regressions else 0)
@@ -6,7 +6,12 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import functools
+import json
 import sys
+import time
+import tracemalloc
+import weakref
 from collections import deque
 
 from utils import *
@@ -171,17 +176,131 @@ class SimpleProblemSolvingAgentProgram:
         raise NotImplementedError
 
 
+# ______________________________________________________________________________
+# Search budgets
+
+
+class SearchBudget:
+    """A limit on the work a search may do: at most max_expansions calls to
+    problem.actions, and/or no work after deadline (a time.perf_counter()
+    value) or timeout seconds after the search starts. Pass it to any search
+    decorated with @budgeted as budget=SearchBudget(...)."""
+
+    def __init__(self, max_expansions=None, timeout=None, deadline=None):
+        self.max_expansions = max_expansions
+        self.timeout = timeout
+        self.deadline = deadline
+        self.expansions = 0
+        self.started = None
+        self.stop = deadline
+
+    def start(self):
+        """Reset the count and the clock; a budget can be reused across searches."""
+        self.started = time.perf_counter()
+        self.expansions = 0
+        self.stop = self.deadline
+        if self.timeout is not None:
+            stop = self.started + self.timeout
+            self.stop = stop if self.stop is None else min(self.stop, stop)
+
+    def charge(self):
+        """Count one expansion; raise OutOfBudget if the budget is spent."""
+        self.expansions += 1
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            raise OutOfBudget('expansions')
+        if self.stop is not None and time.perf_counter() > self.stop:
+            raise OutOfBudget('deadline')
+
+    def exceeded(self, reason, stats=None):
+        return BudgetExceeded(reason, self.expansions - 1,
+                              time.perf_counter() - self.started, stats)
+
+
+class OutOfBudget(Exception):
+    """Raised by SearchBudget.charge to unwind a search that ran out of budget."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class BudgetExceeded:
+    """What a search returns instead of a Node (or None, for no solution) when
+    it runs out of budget. reason is 'expansions' or 'deadline'; stats are the
+    InstrumentedProblem statistics so far, if the problem was instrumented."""
+
+    def __init__(self, reason, expansions, elapsed, stats=None):
+        self.reason = reason
+        self.expansions = expansions
+        self.elapsed = elapsed
+        self.stats = stats
+
+    def __repr__(self):
+        return '<BudgetExceeded {} after {} expansions, {:.3f}s>'.format(
+            self.reason, self.expansions, self.elapsed)
+
+
+class BudgetedProblem(Problem):
+    """Delegates to a problem, charging a SearchBudget on every expansion."""
+
+    def __init__(self, problem, budget):
+        self.problem = problem
+        self.budget = budget
+
+    def actions(self, state):
+        self.budget.charge()
+        return self.problem.actions(state)
+
+    def result(self, state, action):
+        return self.problem.result(state, action)
+
+    def goal_test(self, state):
+        return self.problem.goal_test(state)
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def value(self, state):
+        return self.problem.value(state)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+
+def budgeted(search):
+    """Decorator that adds a budget=None keyword to a search function. With a
+    SearchBudget the search runs on a BudgetedProblem and returns a
+    BudgetExceeded if the budget runs out; without one the search is called
+    directly, so there is no per-node cost."""
+
+    @functools.wraps(search)
+    def wrapper(problem, *args, budget=None, **kwargs):
+        if budget is None:
+            return search(problem, *args, **kwargs)
+        budget.start()
+        try:
+            return search(BudgetedProblem(problem, budget), *args, **kwargs)
+        except OutOfBudget as out_of_budget:
+            stats = problem.stats() if isinstance(problem, InstrumentedProblem) else None
+            return budget.exceeded(out_of_budget.reason, stats)
+
+    return wrapper
+
+
 # ______________________________________________________________________________
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+@budgeted
+def breadth_first_tree_search(problem, progress=None):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    If given, progress(event, node, frontier_size) is called with event
+    'expand' before each node is expanded and 'goal' when a goal is found.
     """
 
     frontier = deque([Node(problem.initial)])  # FIFO queue
@@ -189,18 +308,24 @@ def breadth_first_tree_search(problem):
     while frontier:
         node = frontier.popleft()
         if problem.goal_test(node.state):
+            if progress is not None:
+                progress('goal', node, len(frontier))
             return node
+        if progress is not None:
+            progress('expand', node, len(frontier))
         frontier.extend(node.expand(problem))
     return None
 
 
-def depth_first_tree_search(problem):
+@budgeted
+def depth_first_tree_search(problem, progress=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    See breadth_first_tree_search for the progress hook.
     """
 
     frontier = [Node(problem.initial)]  # Stack
@@ -208,12 +333,17 @@ def depth_first_tree_search(problem):
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if progress is not None:
+                progress('goal', node, len(frontier))
             return node
+        if progress is not None:
+            progress('expand', node, len(frontier))
         frontier.extend(node.expand(problem))
     return None
 
 
-def depth_first_graph_search(problem):
+@budgeted
+def depth_first_graph_search(problem, transposition_table=False, progress=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -221,64 +351,111 @@ def depth_first_graph_search(problem):
     The argument frontier should be an empty queue.
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
+    With transposition_table=True every generated state is kept in a hash
+    set, so the frontier is never scanned and a state is only expanded once.
+    See breadth_first_tree_search for the progress hook.
     """
     frontier = [(Node(problem.initial))]  # Stack
 
     explored = set()
+    reached = {problem.initial} if transposition_table else None
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if progress is not None:
+                progress('goal', node, len(frontier))
             return node
+        if progress is not None:
+            progress('expand', node, len(frontier))
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        if transposition_table:
+            for child in node.expand(problem):
+                if child.state not in reached:
+                    reached.add(child.state)
+                    frontier.append(child)
+        else:
+            frontier.extend(child for child in node.expand(problem)
+                            if child.state not in explored and child not in frontier)
     return None
 
 
-def breadth_first_graph_search(problem):
+@budgeted
+def breadth_first_graph_search(problem, transposition_table=False, progress=None):
     """[Figure 3.11]
     Note that this function can be implemented in a
     single line as below:
     return graph_search(problem, FIFOQueue())
+    With transposition_table=True frontier membership is checked in a hash
+    set of every generated state instead of scanning the frontier.
+    See breadth_first_tree_search for the progress hook.
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
+        if progress is not None:
+            progress('goal', node, 0)
         return node
     frontier = deque([node])
     explored = set()
+    reached = {node.state} if transposition_table else None
     while frontier:
         node = frontier.popleft()
+        if progress is not None:
+            progress('expand', node, len(frontier))
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
-                if problem.goal_test(child.state):
-                    return child
-                frontier.append(child)
+            if transposition_table:
+                if child.state in reached:
+                    continue
+                reached.add(child.state)
+            elif child.state in explored or child in frontier:
+                continue
+            if problem.goal_test(child.state):
+                if progress is not None:
+                    progress('goal', child, len(frontier))
+                return child
+            frontier.append(child)
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+@budgeted
+def best_first_graph_search(problem, f, display=False, transposition_table=False,
+                            progress=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    With transposition_table=True the best f found for each state is kept
+    in a dict; a child is only queued if it improves on it, and outdated
+    entries are skipped when popped, instead of searching the frontier.
+    See breadth_first_tree_search for the progress hook."""
     f = memoize(f, 'f')
     node = Node(problem.initial)
     frontier = PriorityQueue('min', f)
     frontier.append(node)
     explored = set()
+    reached = {node.state: f(node)} if transposition_table else None
     while frontier:
         node = frontier.pop()
+        if transposition_table and node.state in explored:
+            continue
         if problem.goal_test(node.state):
             if display:
                 print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
+            if progress is not None:
+                progress('goal', node, len(frontier))
             return node
+        if progress is not None:
+            progress('expand', node, len(frontier))
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if transposition_table:
+                if child.state not in explored and f(child) < reached.get(child.state, np.inf):
+                    reached[child.state] = f(child)
+                    frontier.append(child)
+            elif child.state not in explored and child not in frontier:
                 frontier.append(child)
             elif child in frontier:
                 if f(child) < frontier[child]:
@@ -287,20 +464,29 @@ def best_first_graph_search(problem, f, display=False):
     return None
 
 
-def uniform_cost_search(problem, display=False):
+@budgeted
+def uniform_cost_search(problem, display=False, progress=None):
     """[Figure 3.14]"""
-    return best_first_graph_search(problem, lambda node: node.path_cost, display)
+    return best_first_graph_search(problem, lambda node: node.path_cost, display,
+                                   progress=progress)
 
 
-def depth_limited_search(problem, limit=50):
-    """[Figure 3.17]"""
+@budgeted
+def depth_limited_search(problem, limit=50, progress=None):
+    """[Figure 3.17]
+    See breadth_first_tree_search for the progress hook; there is no
+    explicit frontier, so frontier_size is None."""
 
     def recursive_dls(node, problem, limit):
         if problem.goal_test(node.state):
+            if progress is not None:
+                progress('goal', node, None)
             return node
         elif limit == 0:
             return 'cutoff'
         else:
+            if progress is not None:
+                progress('expand', node, None)
             cutoff_occurred = False
             for child in node.expand(problem):
                 result = recursive_dls(child, problem, limit - 1)
@@ -314,10 +500,11 @@ def depth_limited_search(problem, limit=50):
     return recursive_dls(Node(problem.initial), problem, limit)
 
 
-def iterative_deepening_search(problem):
+@budgeted
+def iterative_deepening_search(problem, progress=None):
     """[Figure 3.18]"""
     for depth in range(sys.maxsize):
-        result = depth_limited_search(problem, depth)
+        result = depth_limited_search(problem, depth, progress)
         if result != 'cutoff':
             return result
 
@@ -326,9 +513,11 @@ def iterative_deepening_search(problem):
 # Bidirectional Search
 # Pseudocode from https://webdocs.cs.ualberta.ca/%7Eholte/Publications/MM-AAAI2016.pdf
 
+@budgeted
 def bidirectional_search(problem):
     e = 0
-    if isinstance(problem, GraphProblem):
+    unwrapped = problem.problem if isinstance(problem, BudgetedProblem) else problem
+    if isinstance(unwrapped, GraphProblem):
         e = problem.find_min_edge()
     gF, gB = {Node(problem.initial): 0}, {Node(problem.goal): 0}
     openF, openB = [Node(problem.initial)], [Node(problem.goal)]
@@ -410,17 +599,21 @@ greedy_best_first_graph_search = best_first_graph_search
 
 
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
-def greedy_search(problem, h=None):
+@budgeted
+def greedy_search(problem, h=None, transposition_table=False, progress=None):
     """f(n) = h(n)"""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, h)
+    return best_first_graph_search(problem, h, transposition_table=transposition_table,
+                                   progress=progress)
 
-def astar_search(problem, h=None, display=False):
+@budgeted
+def astar_search(problem, h=None, display=False, transposition_table=False, progress=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display,
+                                   transposition_table, progress)
 
 
 # ______________________________________________________________________________
@@ -603,13 +796,19 @@ class PlanRoute(Problem):
 # Other search algorithms
 
 
-def recursive_best_first_search(problem, h=None):
-    """[Figure 3.26]"""
+@budgeted
+def recursive_best_first_search(problem, h=None, progress=None):
+    """[Figure 3.26]
+    See depth_limited_search for the progress hook."""
     h = memoize(h or problem.h, 'h')
 
     def RBFS(problem, node, flimit):
         if problem.goal_test(node.state):
+            if progress is not None:
+                progress('goal', node, None)
             return node, 0  # (The second value is immaterial)
+        if progress is not None:
+            progress('expand', node, None)
         successors = node.expand(problem)
         if len(successors) == 0:
             return None, np.inf
@@ -635,6 +834,7 @@ def recursive_best_first_search(problem, h=None):
     return result
 
 
+@budgeted
 def hill_climbing(problem):
     """
     [Figure 4.2]
@@ -658,6 +858,7 @@ def exp_schedule(k=20, lam=0.005, limit=100):
     return lambda t: (k * np.exp(-lam * t) if t < limit else 0)
 
 
+@budgeted
 def simulated_annealing(problem, schedule=exp_schedule()):
     """[Figure 4.5] CAUTION: This differs from the pseudocode as it
     returns a state instead of a Node."""
@@ -675,6 +876,7 @@ def simulated_annealing(problem, schedule=exp_schedule()):
             current = next_choice
 
 
+@budgeted
 def simulated_annealing_full(problem, schedule=exp_schedule()):
     """ This version returns all the states encountered in reaching
     the goal state."""
@@ -694,6 +896,7 @@ def simulated_annealing_full(problem, schedule=exp_schedule()):
             current = next_choice
 
 
+@budgeted
 def and_or_graph_search(problem):
     """[Figure 4.11]Used when the environment is nondeterministic and completely observable.
     Contains OR nodes where the agent is free to choose any action.
@@ -1518,34 +1721,102 @@ def mutate_boggle(board):
 
 
 class InstrumentedProblem(Problem):
-    """Delegates to a problem, and keeps statistics."""
-
-    def __init__(self, problem):
+    """Delegates to a problem, and keeps statistics: call counts, time spent
+    in actions, result, goal_test and h, the deepest node expanded and the
+    peak number of generated states that are neither expanded nor discarded.
+    A state counts as discarded once it is garbage collected; states that
+    cannot be weakly referenced (str, tuple, ...) are kept alive until they
+    are expanded instead, so discarded duplicates of those still count.
+    With trace_memory=True, the tracemalloc peak is recorded as well."""
+
+    def __init__(self, problem, trace_memory=False):
         self.problem = problem
-        self.succs = self.goal_tests = self.states = 0
+        self.succs = self.goal_tests = self.states = self.h_calls = 0
         self.found = None
+        self.times = {'actions': 0.0, 'result': 0.0, 'goal_test': 0.0, 'h': 0.0}
+        # (depth, reference) of each generated state that has not been
+        # expanded yet, by id. Expanding a state pops its entry, and so does
+        # collecting it, so that ids are never reused while in the dict.
+        self.depths = {}
+        self.current_depth = 0
+        self.max_depth = 0
+        self.peak_frontier = 1
+        self.start = time.perf_counter()
+        self.trace_memory = trace_memory
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+    def remember_depth(self, state, depth):
+        """Record the depth of a generated state until it is expanded."""
+        key = id(state)
+        depths = self.depths
+        try:
+            reference = weakref.ref(state, lambda _: depths.pop(key, None))
+        except TypeError:
+            reference = state
+        depths[key] = (depth, reference)
 
     def actions(self, state):
         self.succs += 1
-        return self.problem.actions(state)
+        self.current_depth = self.depths.pop(id(state), (0, None))[0]
+        self.max_depth = max(self.max_depth, self.current_depth)
+        start = time.perf_counter()
+        actions = self.problem.actions(state)
+        self.times['actions'] += time.perf_counter() - start
+        return actions
 
     def result(self, state, action):
         self.states += 1
-        return self.problem.result(state, action)
+        start = time.perf_counter()
+        new_state = self.problem.result(state, action)
+        self.times['result'] += time.perf_counter() - start
+        self.remember_depth(new_state, self.current_depth + 1)
+        self.peak_frontier = max(self.peak_frontier, len(self.depths))
+        return new_state
 
     def goal_test(self, state):
         self.goal_tests += 1
+        start = time.perf_counter()
         result = self.problem.goal_test(state)
+        self.times['goal_test'] += time.perf_counter() - start
         if result:
             self.found = state
         return result
 
+    def h(self, node):
+        self.h_calls += 1
+        start = time.perf_counter()
+        value = self.problem.h(node)
+        self.times['h'] += time.perf_counter() - start
+        return value
+
     def path_cost(self, c, state1, action, state2):
         return self.problem.path_cost(c, state1, action, state2)
 
     def value(self, state):
         return self.problem.value(state)
 
+    def stats(self):
+        """Return the statistics collected so far as a dict of plain values."""
+        elapsed = time.perf_counter() - self.start
+        stats = {'succs': self.succs, 'goal_tests': self.goal_tests,
+                 'states': self.states, 'h_calls': self.h_calls,
+                 'found': self.found is not None, 'elapsed': elapsed,
+                 'times': dict(self.times),
+                 'nodes_per_second': self.succs / elapsed if elapsed > 0 else 0.0,
+                 'max_depth': self.max_depth, 'peak_frontier': self.peak_frontier,
+                 'peak_memory': None}
+        if self.trace_memory and tracemalloc.is_tracing():
+            stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        return stats
+
+    def dump(self, file=sys.stdout):
+        """Write stats() to a file as a JSON object."""
+        json.dump(self.stats(), file)
+        file.write('\n')
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
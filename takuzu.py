@@ -6,13 +6,29 @@
 # 99229 Gonçalo Nunes
 # 99297 Pedro Cruz
 
+import argparse
+import multiprocessing
 import numpy as np
+import os
+import random
+import sqlite3
 import sys
+import time
+import zipfile
+from queue import Empty
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from functools import partial
+from itertools import product
 from search import (
+    BudgetExceeded,
+    OutOfBudget,
     Problem,
     Node,
+    SearchBudget,
     astar_search,
+    breadth_first_graph_search,
     breadth_first_tree_search,
+    depth_first_graph_search,
     depth_first_tree_search,
     greedy_search,
     recursive_best_first_search,
@@ -20,16 +36,34 @@ from search import (
 
 
 class TakuzuState:
-    state_id = 0
-
-    def __init__(self, board):
+    def __init__(self, board, consistent: bool = True):
         self.board = board
-        self.id = TakuzuState.state_id
-        TakuzuState.state_id += 1
+        self.consistent = consistent
+
+    def __eq__(self, other):
+        return (isinstance(other, TakuzuState) and
+                self.board.side == other.board.side and
+                self.board.key() == other.board.key())
+
+    def __hash__(self):
+        return self.board.zobrist
+
 
-    def __lt__(self, other):
-        return self.id < other.id
 
+ZOBRIST_TABLES = {}
+
+
+def zobrist_table(side: int) -> list:
+    """Devolve os números aleatórios de Zobrist de um tabuleiro side x side,
+    com o número da célula (row, col) com o valor value na posição
+    (row * side + col) * 2 + value. São gerados com uma semente fixa, por
+    isso o hash de um tabuleiro é sempre o mesmo."""
+    table = ZOBRIST_TABLES.get(side)
+    if (table is None):
+        generator = random.Random(side)
+        table = [generator.getrandbits(64) for _ in range(2 * side * side)]
+        ZOBRIST_TABLES[side] = table
+    return table
 
 
 class Board:
@@ -39,13 +73,54 @@ class Board:
         if (lines <= 0):
             raise ValueError
 
-        if (isinstance(board, np.ndarray)):
-            self.matrix = board
-        else:
-            self.matrix = np.array(board)
+        self.matrix = np.array(board, dtype=np.int8)
 
         self.side = lines
         self.free_cells = free
+        self.trail = None
+        self.init_counters()
+
+
+    def init_counters(self):
+        """Conta as ocorrências de 0s e 1s em cada linha e coluna e regista
+        os padrões das linhas completas e as regras violadas.
+        row_counts[value][row], col_counts[value][col], patterns e os
+        contadores de violações são depois mantidos por change_cell."""
+        side = self.side
+        self.limit = (side + 1) // 2
+        self.row_counts = [[0] * side, [0] * side]
+        self.col_counts = [[0] * side, [0] * side]
+        # patterns[0] conta os padrões das linhas completas e patterns[1]
+        # os das colunas completas.
+        self.patterns = ({}, {})
+        # Contadores de violações: janelas com três valores iguais,
+        # ocorrências acima do limite e linhas ou colunas repetidas.
+        self.triples = 0
+        self.excess_occurrences = 0
+        self.duplicate_lines = 0
+        # Hash de Zobrist do conteúdo do tabuleiro.
+        self.zobrist_keys = zobrist_table(side)
+        self.zobrist = 0
+
+        for row in range(side):
+            for col in range(side):
+                value = self.get_number(row, col)
+                if (value != 2):
+                    self.row_counts[value][row] += 1
+                    self.col_counts[value][col] += 1
+                    self.zobrist ^= self.zobrist_keys[(row * side + col) * 2 + value]
+
+        for line in range(2 * side):
+            self.remember_pattern(line)
+            self.triples += self.line_triples(line)
+
+        for counts in self.row_counts + self.col_counts:
+            self.excess_occurrences += sum(max(0, count - self.limit) for count in counts)
+
+
+    def violations(self) -> int:
+        """Devolve o número de violações das regras no tabuleiro"""
+        return self.triples + self.excess_occurrences + self.duplicate_lines
 
 
     @staticmethod
@@ -55,7 +130,7 @@ class Board:
 
     def get_number(self, row: int, col: int) -> int:
         """Devolve o valor na respetiva posição do tabuleiro."""
-        return self.matrix[row][col]
+        return self.matrix.item(row, col)
         
         
     def is_empty_cell(self, row: int, col: int) -> bool:
@@ -65,7 +140,7 @@ class Board:
     
     def is_edge_cell(self, row: int, col:int) -> bool:
         """Devolve True se a célula está num dos lados do tabuleiro"""
-        return row in (0, board.side - 1) or col in (0, board.side - 1)
+        return row in (0, self.side - 1) or col in (0, self.side - 1)
     
     
     def get_row(self, row: int):
@@ -73,6 +148,61 @@ class Board:
         return self.matrix[row]
         
 
+    def get_line(self, line: int) -> list:
+        """Devolve os valores de uma linha (0 <= line < side) ou de uma
+        coluna (side <= line < 2 * side) do tabuleiro"""
+        if (line < self.side):
+            return self.matrix[line].tolist()
+        return self.matrix[:, line - self.side].tolist()
+
+
+    def get_segment(self, line: int, start: int, stop: int) -> list:
+        """Devolve os valores das posições start a stop - 1 de uma linha
+        ou coluna (ver get_line)"""
+        if (line < self.side):
+            return self.matrix[line, start:stop].tolist()
+        return self.matrix[start:stop, line - self.side].tolist()
+
+
+    def line_free(self, line: int) -> int:
+        """Devolve o número de células vazias de uma linha ou coluna"""
+        if (line < self.side):
+            counts, index = self.row_counts, line
+        else:
+            counts, index = self.col_counts, line - self.side
+        return self.side - counts[0][index] - counts[1][index]
+
+
+    def to_array(self):
+        """Devolve o tabuleiro como uma matriz de int8"""
+        return self.matrix
+
+
+    def to_bytes(self) -> bytes:
+        """Serializa o conteúdo do tabuleiro, com um byte por célula"""
+        return self.to_array().tobytes()
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes, side: int):
+        """Constrói um tabuleiro a partir do resultado de to_bytes"""
+        matrix = np.frombuffer(data, dtype=np.int8).reshape(side, side)
+        return cls(matrix, side, int(np.count_nonzero(matrix == 2)))
+
+
+    def key(self):
+        """Devolve uma chave compacta que identifica o conteúdo do tabuleiro"""
+        return self.matrix.tobytes()
+
+
+    def find_empty_cell(self):
+        """Devolve a primeira célula vazia do tabuleiro, ou None"""
+        if (self.free_cells == 0):
+            return None
+        position = int(np.argmax(self.matrix == 2))
+        return divmod(position, self.side)
+
+
     def adjacent_vertical_numbers(self, row: int, col: int) -> (int, int):
         """Devolve os valores imediatamente abaixo e acima,
         respectivamente."""
@@ -107,14 +237,171 @@ class Board:
         return output
 
 
+    def set_value(self, row: int, col: int, value: int):
+        """Escreve o valor na célula sem atualizar os contadores"""
+        self.matrix[row, col] = value
+
+
     def change_cell(self, row: int, col:int, value: int):
         """Muda o valor numa dada célula do tabuleiro"""
-        self.matrix[row][col] = value
-        self.free_cells = self.free_cells - 1
+        old_value = self.get_number(row, col)
+        if (self.trail is not None):
+            self.trail.append((row, col, old_value))
+
+        side = self.side
+        limit = self.limit
+        zobrist_index = (row * side + col) * 2
+
+        if (old_value == 2):
+            self.free_cells = self.free_cells - 1
+        else:
+            self.zobrist ^= self.zobrist_keys[zobrist_index + old_value]
+            self.forget_pattern(row)
+            self.forget_pattern(side + col)
+            self.triples -= self.triples_around(row, col) + self.triples_around(side + col, row)
+            row_counts = self.row_counts[old_value]
+            col_counts = self.col_counts[old_value]
+            self.excess_occurrences -= (row_counts[row] > limit) + (col_counts[col] > limit)
+            row_counts[row] -= 1
+            col_counts[col] -= 1
+
+        if (value == 2):
+            self.free_cells = self.free_cells + 1
+        else:
+            self.zobrist ^= self.zobrist_keys[zobrist_index + value]
+            row_counts = self.row_counts[value]
+            col_counts = self.col_counts[value]
+            self.excess_occurrences += (row_counts[row] >= limit) + (col_counts[col] >= limit)
+            row_counts[row] += 1
+            col_counts[col] += 1
+
+        self.set_value(row, col, value)
+
+        if (value != 2):
+            self.triples += self.triples_around(row, col) + self.triples_around(side + col, row)
+            self.remember_pattern(row)
+            self.remember_pattern(side + col)
+
+
+    def remember_pattern(self, line: int):
+        """Regista o padrão de uma linha ou coluna, se estiver completa"""
+        if (self.line_free(line) != 0):
+            return
+
+        patterns = self.patterns[line >= self.side]
+        key = self.line_pattern(line)
+        count = patterns.get(key, 0)
+        if (count):
+            self.duplicate_lines += 1
+        patterns[key] = count + 1
+
+
+    def forget_pattern(self, line: int):
+        """Retira o padrão de uma linha ou coluna completa que vai mudar"""
+        if (self.line_free(line) != 0):
+            return
+
+        patterns = self.patterns[line >= self.side]
+        key = self.line_pattern(line)
+        count = patterns[key] - 1
+        if (count):
+            self.duplicate_lines -= 1
+            patterns[key] = count
+        else:
+            del patterns[key]
+
+
+    def snapshot(self) -> tuple:
+        """Devolve a posição atual do trail e uma cópia, em O(n), dos
+        contadores mantidos por change_cell, para ser reposta com restore.
+        O trail só é mantido se tiver sido ativado com board.trail = []."""
+        return (len(self.trail), self.free_cells,
+                (self.row_counts[0][:], self.row_counts[1][:]),
+                (self.col_counts[0][:], self.col_counts[1][:]),
+                (self.patterns[0].copy(), self.patterns[1].copy()),
+                self.triples, self.excess_occurrences, self.duplicate_lines, self.zobrist,
+                self.save_cells())
+
+
+    def restore(self, snapshot: tuple, reuse: bool = False):
+        """Desfaz as alterações registadas no trail depois do snapshot. As
+        células são repostas com load_cells e os contadores são copiados do
+        snapshot, em vez de se refazerem as contas de change_cell para cada
+        célula. Se reuse for True, o snapshot não volta a ser usado e os
+        contadores passam para o tabuleiro sem cópia."""
+        (mark, free, row_counts, col_counts, patterns,
+         triples, excess_occurrences, duplicate_lines, zobrist, cells) = snapshot
+        trail = self.trail
+        if (len(trail) == mark):
+            return
+
+        self.load_cells(cells, mark, reuse)
+        del trail[mark:]
+
+        self.free_cells = free
+        if (reuse):
+            self.row_counts, self.col_counts = list(row_counts), list(col_counts)
+            self.patterns = patterns
+        else:
+            self.row_counts = [row_counts[0][:], row_counts[1][:]]
+            self.col_counts = [col_counts[0][:], col_counts[1][:]]
+            self.patterns = (patterns[0].copy(), patterns[1].copy())
+        self.triples = triples
+        self.excess_occurrences = excess_occurrences
+        self.duplicate_lines = duplicate_lines
+        self.zobrist = zobrist
+
+
+    def save_cells(self):
+        """Devolve o que snapshot guarda das células: nada, porque as células
+        alteradas são repostas a partir do trail"""
+        return None
+
+
+    def load_cells(self, cells, mark: int, reuse: bool):
+        """Repõe as células alteradas depois da posição mark do trail"""
+        trail = self.trail
+        for i in range(len(trail) - 1, mark - 1, -1):
+            row, col, value = trail[i]
+            self.set_value(row, col, value)
+
+
+    @staticmethod
+    def count_triples(values: list) -> int:
+        """Devolve o número de janelas com três valores iguais seguidos"""
+        return sum(1 for i in range(len(values) - 2)
+                   if values[i] == values[i + 1] == values[i + 2] != 2)
+
+
+    def line_triples(self, line: int) -> int:
+        """Devolve o número de triplos numa linha ou coluna"""
+        return Board.count_triples(self.get_line(line))
+
+
+    def triples_around(self, line: int, index: int) -> int:
+        """Devolve o número de triplos de uma linha ou coluna que incluem a
+        posição index"""
+        return Board.count_triples(self.get_segment(line, max(0, index - 2),
+                                                    min(self.side, index + 3)))
 
 
     @staticmethod
-    def parse_instance_from_stdin():
+    def pattern_of(values) -> int:
+        """Devolve a máscara das posições com 1 numa linha completa"""
+        pattern = 0
+        for i, value in enumerate(values):
+            if (value == 1):
+                pattern |= 1 << i
+        return pattern
+
+
+    def line_pattern(self, line: int) -> int:
+        """Devolve o padrão (ver pattern_of) de uma linha ou coluna"""
+        return Board.pattern_of(self.get_line(line))
+
+
+    @classmethod
+    def parse_instance_from_stdin(cls):
         """Lê o test do standard input (stdin) que é passado como argumento
         e retorna uma instância da classe Board.
 
@@ -124,57 +411,366 @@ class Board:
             > from sys import stdin
             > stdin.readline()
         """
-        input_file = sys.stdin.readlines()
-
-        board = []
-        free_cells = 0
-        for it, line in enumerate(input_file):
-            if (it > 0):
-                line = line.split('\t')
-                row = [int(num) for num in line]
-                free_cells += row.count(2)
-                board.append(row)
-            else:
-                num_lines = int(line)
+        return cls.parse_instance(sys.stdin.buffer.read())
+
+
+    @classmethod
+    def parse_instances_from_stdin(cls):
+        """Lê do standard input uma ou mais instâncias seguidas e devolve um
+        iterador de instâncias da classe (ver parse_instances)"""
+        return cls.parse_instances(sys.stdin.buffer.read())
+
+
+    @classmethod
+    def parse_instance(cls, data):
+        """Lê uma única instância no formato do enunciado (número de linhas
+        seguido das linhas do tabuleiro) e retorna uma instância da classe"""
+        boards = list(cls.parse_instances(data))
+        if (len(boards) != 1):
+            raise ValueError("esperada uma instância, encontradas {}".format(len(boards)))
+        return boards[0]
+
+
+    @classmethod
+    def parse_instances(cls, data):
+        """Devolve um iterador com as instâncias de data (bytes ou str), que
+        pode ter várias instâncias seguidas. Os valores podem estar separados
+        por tabs ou espaços e as linhas em branco são ignoradas. Os valores de
+        cada instância são convertidos de uma só vez numa matriz de int8.
+        Lança ValueError se as dimensões ou os valores forem inválidos."""
+        if (isinstance(data, str)):
+            data = data.encode()
+
+        lines = [line for line in data.splitlines() if not line.isspace() and line]
+        index = 0
+        while (index < len(lines)):
+            header = lines[index].split()
+            if (len(header) != 1 or not header[0].isdigit() or int(header[0]) <= 0):
+                raise ValueError("linha {}: esperado o tamanho do tabuleiro".format(index + 1))
+            side = int(header[0])
+
+            rows = lines[index + 1:index + 1 + side]
+            if (len(rows) != side):
+                raise ValueError("esperadas {} linhas, encontradas {}".format(side, len(rows)))
+
+            cells = []
+            for row in rows:
+                values = row.split()
+                if (len(values) != side):
+                    raise ValueError("esperados {} valores por linha, encontrados {}".format(
+                        side, len(values)))
+                cells.extend(values)
+
+            # Se todos os valores tiverem um só dígito, a junção tem
+            # exatamente side * side bytes, entre b"0" e b"2".
+            digits = np.frombuffer(b"".join(cells), dtype=np.uint8) - ord("0")
+            if (digits.size != side * side or (digits > 2).any()):
+                raise ValueError("os valores têm de ser 0, 1 ou 2")
+
+            matrix = digits.astype(np.int8).reshape(side, side)
+            yield cls(matrix, side, int(np.count_nonzero(matrix == 2)))
+            index += side + 1
+
+
+    def copy_state_to(self, new_board):
+        """Copia para new_board o estado comum a todas as representações"""
+        new_board.side = self.side
+        new_board.free_cells = self.free_cells
+        new_board.trail = None
+        new_board.row_counts = [self.row_counts[0][:], self.row_counts[1][:]]
+        new_board.col_counts = [self.col_counts[0][:], self.col_counts[1][:]]
+        new_board.patterns = (self.patterns[0].copy(), self.patterns[1].copy())
+        new_board.limit = self.limit
+        new_board.triples = self.triples
+        new_board.excess_occurrences = self.excess_occurrences
+        new_board.duplicate_lines = self.duplicate_lines
+        new_board.zobrist_keys = self.zobrist_keys
+        new_board.zobrist = self.zobrist
 
 
-        return Board(board, num_lines, free_cells)
-    
-    
     def deep_copy(self):
-        side = board.side
-        
-        new_board = Board(np.ndarray(shape=(side, side), dtype=int), side, self.free_cells)
-        
-        
-        for row in range(board.side):
-            for col in range(board.side):
-                new_board.change_cell(row, col, int(self.get_number(row, col)))
-        
-        new_board.free_cells = self.free_cells
-        
-        
+        """Devolve uma cópia independente do tabuleiro. A matriz é copiada
+        de uma só vez e os contadores são copiados em O(n)."""
+        new_board = Board.__new__(Board)
+        new_board.matrix = self.matrix.copy()
+        self.copy_state_to(new_board)
+
         return new_board
 
 
+    def format_bytes(self) -> bytes:
+        """Devolve o tabuleiro no formato de saída (valores separados por
+        tabs e uma linha por linha do tabuleiro, terminada em '\\n'). Os
+        dígitos, os tabs e as mudanças de linha são escritos de uma só vez
+        numa matriz de bytes."""
+        side = self.side
+        out = np.full((side, 2 * side), ord("\t"), dtype=np.uint8)
+        out[:, 0::2] = self.to_array() + ord("0")
+        out[:, -1] = ord("\n")
+        return out.tobytes()
+
+
     def __str__(self):
-        out = ""
-        
-        for row in range(self.side):
-            for col in range(self.side):
-                out += str(self.get_number(row, col))
-                if col < (self.side - 1):
-                    out += '\t'
-            
-            if (row != (self.side - 1)):
-                out += '\n'
-        return out
+        return self.format_bytes()[:-1].decode()
+
+
+class BitBoard(Board):
+    """Representação de um tabuleiro de Takuzu através de máscaras de bits.
+
+    Cada linha e cada coluna guardam duas máscaras inteiras: uma com as
+    posições preenchidas e outra com as posições que contêm um 1. O bit
+    col da máscara de uma linha corresponde à célula (row, col) e o bit row
+    da máscara de uma coluna à mesma célula."""
+
+    def __init__(self, board, lines: int, free: int):
+        if (lines <= 0):
+            raise ValueError
+
+        self.side = lines
+        self.free_cells = free
+        self.trail = None
+        self.row_filled = [0] * lines
+        self.row_ones = [0] * lines
+        self.col_filled = [0] * lines
+        self.col_ones = [0] * lines
+
+        for row, values in enumerate(np.asarray(board, dtype=np.int8).tolist()):
+            for col, value in enumerate(values):
+                if (value != 2):
+                    self.set_value(row, col, value)
+
+        self.init_counters()
+
+
+    def set_value(self, row: int, col: int, value: int):
+        """Atualiza as máscaras da linha e da coluna de uma célula"""
+        row_bit = 1 << col
+        col_bit = 1 << row
+
+        if (value == 2):
+            self.row_filled[row] &= ~row_bit
+            self.col_filled[col] &= ~col_bit
+        else:
+            self.row_filled[row] |= row_bit
+            self.col_filled[col] |= col_bit
+
+        if (value == 1):
+            self.row_ones[row] |= row_bit
+            self.col_ones[col] |= col_bit
+        else:
+            self.row_ones[row] &= ~row_bit
+            self.col_ones[col] &= ~col_bit
+
+
+    def save_cells(self):
+        """Copia as máscaras, o que sai mais barato do que repor as células
+        do trail uma a uma"""
+        return (self.row_filled[:], self.row_ones[:], self.col_filled[:], self.col_ones[:])
+
+
+    def load_cells(self, cells, mark: int, reuse: bool):
+        if (reuse):
+            self.row_filled, self.row_ones, self.col_filled, self.col_ones = cells
+        else:
+            self.row_filled, self.row_ones, self.col_filled, self.col_ones = (
+                [masks[:] for masks in cells])
+
+
+    def get_number(self, row: int, col: int) -> int:
+        """Devolve o valor na respetiva posição do tabuleiro."""
+        if (not (self.row_filled[row] >> col) & 1):
+            return 2
+        return (self.row_ones[row] >> col) & 1
+
+
+    def get_row(self, row: int):
+        """Devolve uma linha do tabuleiro"""
+        return self.get_line(row)
+
+
+    def line_masks(self, line: int) -> (int, int):
+        """Devolve as máscaras (preenchidas, com 1) de uma linha
+        (0 <= line < side) ou de uma coluna (side <= line < 2 * side)"""
+        if (line < self.side):
+            return self.row_filled[line], self.row_ones[line]
+        return self.col_filled[line - self.side], self.col_ones[line - self.side]
+
+
+    def get_line(self, line: int) -> list:
+        filled, ones = self.line_masks(line)
+        return [(ones >> i) & 1 if (filled >> i) & 1 else 2
+                for i in range(self.side)]
+
+
+    def get_segment(self, line: int, start: int, stop: int) -> list:
+        filled, ones = self.line_masks(line)
+        return [(ones >> i) & 1 if (filled >> i) & 1 else 2
+                for i in range(start, stop)]
+
+
+    def to_array(self):
+        side = self.side
+        if (side > 64):
+            return np.array([self.get_line(row) for row in range(side)], dtype=np.int8)
+
+        shifts = np.arange(side, dtype=np.uint64)
+        filled = (np.array(self.row_filled, dtype=np.uint64)[:, None] >> shifts) & 1
+        ones = (np.array(self.row_ones, dtype=np.uint64)[:, None] >> shifts) & 1
+        return np.where(filled == 1, ones, 2).astype(np.int8)
+
+
+    def key(self):
+        return tuple(self.row_filled) + tuple(self.row_ones)
+
+
+    def find_empty_cell(self):
+        full = (1 << self.side) - 1
+        for row, filled in enumerate(self.row_filled):
+            if (filled != full):
+                free = ~filled & full
+                return row, (free & -free).bit_length() - 1
+        return None
+
+
+    def triple_mask(self, line: int) -> int:
+        """Devolve uma máscara com o bit i ligado se as posições i, i + 1 e
+        i + 2 de uma linha ou coluna têm o mesmo valor"""
+        filled, ones = self.line_masks(line)
+        zeros = filled & ~ones
+        return (ones & (ones >> 1) & (ones >> 2)) | (zeros & (zeros >> 1) & (zeros >> 2))
+
+
+    def line_triples(self, line: int) -> int:
+        return bin(self.triple_mask(line)).count("1")
+
+
+    def triples_around(self, line: int, index: int) -> int:
+        start = max(0, index - 2)
+        return bin((self.triple_mask(line) >> start) & ((1 << (index - start + 1)) - 1)).count("1")
+
+
+    def line_pattern(self, line: int) -> int:
+        if (line < self.side):
+            return self.row_ones[line]
+        return self.col_ones[line - self.side]
+
+
+    def deep_copy(self):
+        """Devolve uma cópia independente do tabuleiro em O(n)"""
+        new_board = BitBoard.__new__(BitBoard)
+        new_board.row_filled = self.row_filled[:]
+        new_board.row_ones = self.row_ones[:]
+        new_board.col_filled = self.col_filled[:]
+        new_board.col_ones = self.col_ones[:]
+        self.copy_state_to(new_board)
+
+        return new_board
+
+
+BOARD_BACKENDS = {
+    "numpy": Board,
+    "bits": BitBoard,
+}
+
+
+def first_empty_cell(board: Board):
+    """Escolhe a primeira célula vazia, percorrendo o tabuleiro por linhas"""
+    return board.find_empty_cell()
+
+
+def cell_in_line(board: Board, line: int):
+    """Escolhe, entre as células vazias de uma linha ou coluna, a que tem
+    menos células vazias na linha perpendicular"""
+    side = board.side
+    best = None
+    for index, value in enumerate(board.get_line(line)):
+        if (value == 2):
+            cross = side + index if line < side else index
+            free = board.line_free(cross)
+            if (best is None or free < best[0]):
+                best = (free, index)
+
+    if (line < side):
+        return line, best[1]
+    return best[1], line - side
+
+
+def fewest_free_cell(board: Board):
+    """Escolhe uma célula da linha ou coluna com menos células vazias
+    (minimum remaining values)"""
+    free, line = min((board.line_free(line), line) for line in range(2 * board.side)
+                     if board.line_free(line))
+    return cell_in_line(board, line)
+
+
+def most_constrained_cell(board: Board):
+    """Escolhe uma célula da linha ou coluna em que um dos valores está mais
+    perto de atingir o limite de ocorrências, ou seja, onde é mais provável
+    que a escolha provoque um conflito"""
+    side = board.side
+    limit = (side + 1) // 2
+
+    def slack(line):
+        counts = board.row_counts if line < side else board.col_counts
+        index = line if line < side else line - side
+        return min(limit - counts[0][index], limit - counts[1][index]), board.line_free(line)
+
+    line = min((line for line in range(2 * side) if board.line_free(line)), key=slack)
+    return cell_in_line(board, line)
+
+
+BRANCHING_STRATEGIES = {
+    "first": first_empty_cell,
+    "mrv": fewest_free_cell,
+    "conflict": most_constrained_cell,
+}
+
+
+def fixed_value_order(board: Board, row: int, col: int):
+    """Experimenta sempre o 1 antes do 0"""
+    return (1, 0)
+
+
+def least_used_value_order(board: Board, row: int, col: int):
+    """Experimenta primeiro o valor que ainda pode aparecer mais vezes na
+    linha e na coluna da célula, que é o que tem menos probabilidade de
+    violar a regra da contagem"""
+    if (board.row_counts[0][row] + board.col_counts[0][col] <
+        board.row_counts[1][row] + board.col_counts[1][col]):
+        return (0, 1)
+    return (1, 0)
+
+
+def random_value_order(board: Board, row: int, col: int):
+    """Escolhe a ordem ao acaso, com o gerador global do módulo random (ver
+    solve_portfolio, que lhe dá uma semente diferente em cada processo)"""
+    if (random.random() < 0.5):
+        return (0, 1)
+    return (1, 0)
+
+
+VALUE_ORDERINGS = {
+    "fixed": fixed_value_order,
+    "least-used": least_used_value_order,
+    "random": random_value_order,
+}
 
 
 class Takuzu(Problem):
-    def __init__(self, board: Board):
-        """O construtor especifica o estado inicial."""
-        self.initial_state = TakuzuState(board)
+    def __init__(self, board: Board, branching: str = "mrv", ordering: str = "least-used"):
+        """O construtor especifica o estado inicial. branching e ordering
+        escolhem, de BRANCHING_STRATEGIES e VALUE_ORDERINGS, a célula em que
+        se ramifica e a ordem pela qual se experimentam os seus valores."""
+        self.branching = branching
+        self.ordering = ordering
+        self.pick_cell = BRANCHING_STRATEGIES[branching]
+        self.order_values = VALUE_ORDERINGS[ordering]
+
+        board = board.deep_copy()
+        filled = [(row, col) for row in range(board.side)
+                  for col in range(board.side) if not board.is_empty_cell(row, col)]
+        consistent = self.propagate(board, filled)
+        self.initial_state = TakuzuState(board, consistent)
         super().__init__(self.initial_state)
         
 
@@ -183,40 +779,16 @@ class Takuzu(Problem):
         partir do estado passado como argumento."""
         
         
-        side = state.board.side
-        actions = []
-        action_picked = False
-        row = 0
-        while (row < side and not action_picked):
-            for col in range(side):
-                if (state.board.is_empty_cell(row, col)):
-                    option = self.pick_conditioned_by_adjacencies(row, col, state.board)
-                    
-                    if (option == -2):
-                        # Kill this branch
-                        actions = []
-                        action_picked = True
-                        break
-                    if (option == -1):
-                        option = self.pick_conditioned_by_number_of_occurences(row, col, state.board)
-                        if (option == -2):
-                            # Kill this branch
-                            actions = []
-                            action_picked = True
-                            break
-
-                    if (option != -1):
-                        actions = [(row, col, option)]
-                        action_picked = True
-                        break
-                    elif (option == -1):
-                        actions = [(row, col, 0), (row, col, 1)]
-
-
-            row = row + 1
-        
+        board = state.board
+        if (not state.consistent or board.free_cells == 0):
+            return []
 
-        return actions
+        # A propagação já aplicou todas as jogadas forçadas, por isso
+        # resta ramificar numa célula vazia. As procuras em profundidade
+        # experimentam primeiro a última ação da lista.
+        row, col = self.pick_cell(board)
+        first, second = self.order_values(board, row, col)
+        return [(row, col, second), (row, col, first)]
 
 
     def result(self, state: TakuzuState, action):
@@ -227,68 +799,161 @@ class Takuzu(Problem):
         board = state.board
         new_board = board.deep_copy()
         
-        new_board.change_cell(action[0], action[1], action[2])
-
-        return TakuzuState(new_board)
+        consistent = self.apply_action(new_board, action)
+
+        return TakuzuState(new_board, consistent)
+
+
+    def apply_action(self, board: Board, action) -> bool:
+        """Aplica a 'action' diretamente sobre o tabuleiro e propaga as
+        suas consequências. Retorna False se o tabuleiro ficar inválido."""
+        row, col, value = action
+        board.change_cell(row, col, value)
+
+        return self.propagate(board, [(row, col)])
+
+
+    def solve_inplace(self, progress=None, budget: SearchBudget = None):
+        """Procura em profundidade que altera um único tabuleiro em vez de
+        criar um novo estado por ação. As células alteradas ficam registadas
+        no trail do tabuleiro, que ocupa O(n²), e cada nível da pilha guarda
+        um snapshot de O(n) contadores (ver Board.snapshot) para se voltar
+        atrás. Como a pilha pode ter até n² níveis, a memória é O(n³) no
+        pior caso, contra um tabuleiro de O(n²) por estado na fronteira das
+        procuras de search.py. Retorna um Node com uma cópia do tabuleiro
+        resolvido, ou None se não houver solução. progress e budget são o
+        mesmo hook e o mesmo limite das procuras de search.py: se o limite
+        for atingido, é devolvido um BudgetExceeded."""
+        if (budget is not None):
+            budget.start()
+        try:
+            _, solution, _ = self.explore(progress=progress, budget=budget)
+        except OutOfBudget as out_of_budget:
+            return budget.exceeded(out_of_budget.reason)
+        if (solution is None):
+            return None
+        return Node(TakuzuState(solution))
+
+
+    def explore(self, max_expansions: int = None, limit: int = 1, progress=None,
+                budget: SearchBudget = None):
+        """Procura em profundidade sobre um único tabuleiro (ver
+        solve_inplace) que continua depois de cada objetivo até encontrar
+        limit soluções (todas, se limit for None) e que desiste ao fim de
+        expandir max_expansions estados. Retorna (número de soluções
+        encontradas, cópia da primeira ou None, estados que ficaram por
+        explorar serializados com to_bytes). Se a fronteira vier vazia e o
+        limite não tiver sido atingido, a contagem é exata. O número de
+        estados expandidos fica em self.expansions. Se for dado,
+        progress(evento, nó, tamanho da pilha) é chamado como nas procuras
+        de search.py; o nó só é criado nesse caso, com a profundidade igual
+        ao tamanho da pilha, e o seu estado é o tabuleiro que vai sendo
+        alterado. Se for dado um SearchBudget já iniciado, cada expansão é
+        descontada nele, o que pode lançar OutOfBudget."""
+        board = self.initial.board.deep_copy()
+        board.trail = []
+        state = TakuzuState(board, self.initial.consistent)
+        self.expansions = 0
+
+        if (self.goal_test(state)):
+            board.trail = None
+            return 1, board, []
+
+        count, solution = 0, None
+        # Cada entrada guarda o snapshot do estado pai e as ações que ainda
+        # faltam experimentar a partir dele. O tabuleiro só é reposto quando
+        # se vai experimentar outra ação, e a última ação de cada nível
+        # aproveita os contadores do snapshot sem os copiar.
+        stack = [(board.snapshot(), self.actions(state))]
+        expansions = 1
+        while stack:
+            snapshot, actions = stack[-1]
+            if (not actions):
+                stack.pop()
+                continue
+
+            if (max_expansions is not None and expansions >= max_expansions):
+                self.expansions = expansions
+                return count, solution, self.remaining_frontier(board, stack)
+
+            board.restore(snapshot, reuse=len(actions) == 1)
+            state.consistent = self.apply_action(board, actions.pop())
+            if (self.goal_test(state)):
+                count += 1
+                if (solution is None):
+                    solution = board.deep_copy()
+                    solution.trail = None
+                if (progress is not None):
+                    node = Node(TakuzuState(solution))
+                    node.depth = len(stack)
+                    progress("goal", node, len(stack))
+                if (limit is not None and count >= limit):
+                    self.expansions = expansions
+                    return count, solution, []
+                continue
+
+            if (progress is not None):
+                node = Node(state)
+                node.depth = len(stack)
+                progress("expand", node, len(stack))
+            if (budget is not None):
+                budget.charge()
+            stack.append((board.snapshot(), self.actions(state)))
+            expansions += 1
+
+        self.expansions = expansions
+        return count, solution, []
+
+
+    def remaining_frontier(self, board: Board, stack: list) -> list:
+        """Serializa os filhos consistentes ainda por experimentar na pilha
+        de explore, pela ordem da pilha (o próximo a experimentar fica no
+        fim). Os níveis são percorridos a partir do topo para que o trail
+        seja sempre desfeito para trás. O tabuleiro fica num estado
+        intermédio, por isso explore não o volta a usar."""
+        levels = []
+        for snapshot, actions in reversed(stack):
+            level = []
+            for action in actions:
+                board.restore(snapshot)
+                if (self.apply_action(board, action)):
+                    level.append(board.to_bytes())
+            levels.append(level)
+        return [data for level in reversed(levels) for data in level]
 
     def goal_test(self, state: TakuzuState):
         """Retorna True se e só se o estado passado como argumento é
         um estado objetivo. Deve verificar se todas as posições do tabuleiro
         estão preenchidas com uma sequência de números adjacentes."""
         board = state.board
-        size = board.side
-        if (board.free_cells == 0):
-            num_occ_col = True
-            num_occ_row = True
-            for i in range(size):
-            
-                num_0_col = 0
-                num_1_col = 0
-                num_0_row = 0
-                num_1_row = 0
-                col_limit = 0
-                col_last_value = -1
-                row_limit = 0
-                row_last_value = -1
-                for j in range(size):
-                    if (board.get_number(j, i) == 2):
-                        return False
-                    if (board.get_number(j, i) == 1):
-                        num_1_col += 1
-                    if (board.get_number(j, i) == 0):
-                        num_0_col += 1
-                    if (board.get_number(i, j) == 0):
-                        num_0_row += 1
-                    if (board.get_number(i, j) == 1):
-                        num_1_row += 1
-                    if (board.get_number(j, i) == col_last_value):
-                        col_limit += 1
-                    else:
-                        col_limit = 1
-                    if (board.get_number(i, j) == row_last_value):
-                        row_limit += 1
-                    else:
-                        row_limit = 1
-                    
-                    if (col_limit == 3 or row_limit == 3):
-                        return False
-                    col_last_value = board.get_number(j, i)
-                    row_last_value = board.get_number(i, j)
-                        
-                if (num_0_col >= num_1_col and num_0_col >= int((size) / 2)):
-                    num_occ_col = self.check_num_occurences(size, num_0_col)
-                elif (num_1_col > num_0_col and num_1_col >= int(size / 2)):
-                    num_occ_col = self.check_num_occurences(size, num_1_col)
-                if (num_0_row >= num_1_row and num_0_row >= int((size) / 2)):
-                    num_occ_row = self.check_num_occurences(size, num_0_row)
-                elif (num_1_row > num_0_row and num_1_row >= int(size / 2)):
-                    num_occ_row = self.check_num_occurences(size, num_1_row)
-                if (not num_occ_col or not num_occ_row):
-                    return False            
-                    
-            return self.check_equal_lines(board)
-
-        return False
+        return (state.consistent and board.free_cells == 0 and
+                board.violations() == 0)
+
+
+    @staticmethod
+    def is_solution(matrix) -> bool:
+        """Verifica com operações vetoriais se a matriz é um tabuleiro
+        resolvido: sem células vazias, com o número certo de 0s e 1s em cada
+        linha e coluna, sem três valores iguais seguidos e sem linhas nem
+        colunas repetidas."""
+        size = matrix.shape[0]
+        if ((matrix == 2).any()):
+            return False
+
+        limit = (size + 1) // 2
+        for ones in (matrix.sum(axis=1), matrix.sum(axis=0)):
+            if ((ones > limit).any() or (size - ones > limit).any()):
+                return False
+
+        # Soma de cada janela de três células seguidas: 0 ou 3 indica três
+        # valores iguais.
+        for lines in (matrix, matrix.T):
+            windows = lines[:, :-2] + lines[:, 1:-1] + lines[:, 2:]
+            if (((windows == 0) | (windows == 3)).any()):
+                return False
+
+        return (np.unique(matrix, axis=0).shape[0] == size and
+                np.unique(matrix, axis=1).shape[1] == size)
 
 
     def h(self, node: Node):
@@ -296,148 +961,954 @@ class Takuzu(Problem):
         return node.state.board.free_cells
 
 
+    def propagate(self, board: Board, cells: list) -> bool:
+        """Aplica as regras do Takuzu até não haver mais células forçadas.
+        cells é a lista de trabalho com as células alteradas desde o último
+        ponto fixo; para cada uma só se analisam as células à sua volta e,
+        quando os contadores o justificam, o resto da sua linha e coluna.
+        Cada célula preenchida entra na lista. Retorna False se for
+        encontrada uma contradição."""
+        worklist = list(cells)
+
+        while worklist:
+            if (board.violations()):
+                return False
+            row, col = worklist.pop()
+
+            forced = self.infer_cell(board, row, col)
+            if (forced is None):
+                return False
+
+            for (row, col), value in forced.items():
+                current = board.get_number(row, col)
+                if (current == 2):
+                    board.change_cell(row, col, value)
+                    worklist.append((row, col))
+                elif (current != value):
+                    return False
+
+        return board.violations() == 0
+
+
+    def infer_cell(self, board: Board, row: int, col: int):
+        """Procura as células forçadas pela alteração da célula (row, col).
+        Aplica as regras dos pares e das sanduíches às janelas de três
+        células que a contêm, a regra da contagem se a sua linha ou coluna
+        atingiu o limite de ocorrências e a regra das linhas distintas se
+        lhes faltam uma ou duas células. Retorna um dicionário
+        {(row, col): valor} ou None se houver uma contradição."""
+        side = board.side
+        limit = (side + 1) // 2
+        value = board.get_number(row, col)
+        forced = {}
+
+        for line, index, count in ((row, col, board.row_counts[value][row]),
+                                   (side + col, row, board.col_counts[value][col])):
+            if (count > limit):
+                return None
+
+            start = max(0, index - 2)
+            around = board.get_segment(line, start, min(side, index + 3))
+            moves = []
+            for i in range(len(around) - 2):
+                a, b, c = around[i], around[i + 1], around[i + 2]
+                if (a == b == c != 2):
+                    return None
+                if (a == b != 2 and c == 2):
+                    moves.append((start + i + 2, 1 - a))
+                elif (b == c != 2 and a == 2):
+                    moves.append((start + i, 1 - b))
+                elif (a == c != 2 and b == 2):
+                    moves.append((start + i + 1, 1 - a))
+
+            free = board.line_free(line)
+            if (count == limit and free):
+                moves.extend((i, 1 - value) for i, other in enumerate(board.get_line(line))
+                             if other == 2)
+
+            if (0 < free <= 2 and board.patterns[line >= side]):
+                distinct = self.infer_distinct_line(board, line, board.get_line(line))
+                if (distinct is None):
+                    return None
+                moves.extend(distinct.items())
+
+            for i, other in moves:
+                key = (line, i) if line < side else (i, line - side)
+                if (forced.setdefault(key, other) != other):
+                    return None
+
+        return forced
+
+
     @staticmethod
-    def get_complementary_value(value: int) -> int:
-        if (value == 1):
-            return 0
-        elif (value == 0):
-            return 1
-        else:
-            return -1
+    def infer_line(values: list):
+        """Aplica as regras dos pares, das sanduíches e da contagem aos
+        valores de uma linha. Retorna um dicionário {posição: valor} com as
+        células forçadas, ou None se a linha já não tiver solução."""
+        size = len(values)
+        limit = (size + 1) // 2
+        num_0 = values.count(0)
+        num_1 = values.count(1)
+        if (num_0 > limit or num_1 > limit):
+            return None
+
+        forced = {}
+
+        def force(index, value):
+            if (forced.setdefault(index, value) != value):
+                return False
+            return True
+
+        for i in range(size - 2):
+            a, b, c = values[i], values[i + 1], values[i + 2]
+            if (a == b == c != 2):
+                return None
+            if (a == b != 2 and c == 2):
+                if (not force(i + 2, 1 - a)):
+                    return None
+            elif (b == c != 2 and a == 2):
+                if (not force(i, 1 - b)):
+                    return None
+            elif (a == c != 2 and b == 2):
+                if (not force(i + 1, 1 - a)):
+                    return None
+
+        if (num_0 == limit or num_1 == limit):
+            value = 1 if num_0 == limit else 0
+            for i in range(size):
+                if (values[i] == 2 and not force(i, value)):
+                    return None
+
+        return forced
+
+
+    def infer_distinct_line(self, board: Board, line: int, values: list):
+        """Aplica a regra de não haver linhas (ou colunas) iguais a uma linha
+        com uma ou duas células vazias: excluem-se as formas de a completar
+        cujo padrão já está registado em board.patterns. As linhas completas
+        repetidas são detetadas diretamente pelo board.duplicate_lines.
+        Retorna o mesmo que infer_line."""
+        empty = [i for i in range(board.side) if values[i] == 2]
+        if (not empty or len(empty) > 2):
+            return {}
+
+        patterns = board.patterns[line >= board.side]
+        # Se nenhuma das formas de completar a linha já existe, esta regra
+        # não acrescenta nada às restantes.
+        base = Board.pattern_of(values)
+        options = list(product((0, 1), repeat=len(empty)))
+        if (not any(base | sum(value << index for index, value in zip(empty, option))
+                    in patterns for option in options)):
+            return {}
+
+        candidates = []
+        for option in options:
+            completion = values[:]
+            for index, value in zip(empty, option):
+                completion[index] = value
+            if (self.infer_line(completion) is not None and
+                Board.pattern_of(completion) not in patterns):
+                candidates.append(completion)
+
+        if (not candidates):
+            return None
+        if (len(candidates) == 1):
+            return {index: candidates[0][index] for index in empty}
+        return {}
+
+
+SEARCH_STRATEGIES = {
+    "dfs": depth_first_tree_search,
+    "bfs": breadth_first_tree_search,
+    "dfs-graph": partial(depth_first_graph_search, transposition_table=True),
+    "bfs-graph": partial(breadth_first_graph_search, transposition_table=True),
+    "greedy": partial(greedy_search, transposition_table=True),
+    "astar": partial(astar_search, transposition_table=True),
+    "rbfs": recursive_best_first_search,
+    "inplace": Takuzu.solve_inplace,
+}
+
+
+# Simetrias do Takuzu: (rotações de 90 graus, transposição, troca de 0s
+# com 1s). As 8 simetrias do quadrado combinadas com a troca de valores
+# transformam tabuleiros válidos em tabuleiros válidos.
+SYMMETRIES = [(rotations, transpose, swap) for swap in (False, True)
+              for transpose in (False, True) for rotations in range(4)]
+
+
+def apply_symmetry(matrix, symmetry):
+    """Aplica uma das SYMMETRIES a uma matriz de int8"""
+    rotations, transpose, swap = symmetry
+    if (transpose):
+        matrix = matrix.T
+    matrix = np.rot90(matrix, rotations)
+    if (swap):
+        matrix = np.where(matrix == 2, 2, 1 - matrix).astype(np.int8)
+    return np.ascontiguousarray(matrix)
+
+
+def invert_symmetry(matrix, symmetry):
+    """Desfaz o apply_symmetry com a mesma simetria"""
+    rotations, transpose, swap = symmetry
+    if (swap):
+        matrix = np.where(matrix == 2, 2, 1 - matrix).astype(np.int8)
+    matrix = np.rot90(matrix, -rotations)
+    if (transpose):
+        matrix = matrix.T
+    return np.ascontiguousarray(matrix)
+
+
+def canonical_form(matrix):
+    """Devolve a menor (em bytes) das 16 imagens da matriz pelas SYMMETRIES
+    e a simetria que a produz"""
+    best = None
+    for symmetry in SYMMETRIES:
+        key = apply_symmetry(matrix, symmetry).tobytes()
+        if (best is None or key < best[0]):
+            best = (key, symmetry)
+    return best
+
+
+class SolutionCache:
+    """Cache persistente de soluções guardada numa base de dados SQLite.
+
+    Os tabuleiros são guardados na sua forma canónica (ver canonical_form),
+    por isso um tabuleiro que seja uma rotação, reflexão ou troca de 0s com
+    1s de outro já resolvido também é encontrado. Quando há mais de
+    max_entries soluções, são removidas as usadas há mais tempo."""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.connection = sqlite3.connect(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS solutions ("
+                "puzzle BLOB PRIMARY KEY, side INTEGER NOT NULL, "
+                "solution BLOB NOT NULL, last_used REAL NOT NULL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+
+
+    def lookup(self, board: Board):
+        """Devolve a solução do tabuleiro como matriz de int8, ou None se
+        não estiver na cache"""
+        key, symmetry = canonical_form(board.to_array())
+        row = self.connection.execute("SELECT solution FROM solutions WHERE puzzle = ?",
+                                      (key,)).fetchone()
+        if (row is None):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self.connection:
+            self.connection.execute("UPDATE solutions SET last_used = ? WHERE puzzle = ?",
+                                    (time.time(), key))
+
+        solution = np.frombuffer(row[0], dtype=np.int8).reshape(board.side, board.side)
+        return invert_symmetry(solution, symmetry)
+
+
+    def store(self, board: Board, solution: Board):
+        """Guarda a solução de um tabuleiro, removendo as entradas mais
+        antigas se a cache ficar cheia"""
+        key, symmetry = canonical_form(board.to_array())
+        canonical_solution = apply_symmetry(solution.to_array(), symmetry)
+
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)",
+                                    (key, board.side, canonical_solution.tobytes(),
+                                     time.time()))
+            self.connection.execute(
+                "DELETE FROM solutions WHERE puzzle IN (SELECT puzzle FROM solutions "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+
+    def stats(self) -> dict:
+        """Devolve o número de hits, misses e entradas da cache"""
+        entries = self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+    def close(self):
+        self.connection.close()
+
+
+class ProgressReporter:
+    """Hook de progresso para as procuras (ver breadth_first_tree_search em
+    search.py) que escreve no stderr, no máximo a cada interval segundos, o
+    número de nós expandidos, os nós por segundo, a profundidade e as
+    células vazias do último nó expandido e o tamanho da fronteira. O
+    relógio só é consultado a cada every expansões."""
+
+    def __init__(self, interval: float = 1.0, every: int = 64, file=sys.stderr):
+        self.interval = interval
+        self.every = every
+        self.file = file
+        self.expanded = 0
+        self.start = self.last_report = time.perf_counter()
+
+
+    def __call__(self, event: str, node: Node, frontier_size: int):
+        if (event == "goal"):
+            self.report("goal", node, frontier_size)
+            return
+
+        self.expanded += 1
+        if (self.expanded % self.every == 0):
+            now = time.perf_counter()
+            if (now - self.last_report >= self.interval):
+                self.last_report = now
+                self.report("progress", node, frontier_size)
+
+
+    def report(self, label: str, node: Node, frontier_size: int):
+        elapsed = time.perf_counter() - self.start
+        print("{}: {:.1f}s {} nodes ({:.0f} nodes/s) depth {} free {} frontier {}".format(
+            label, elapsed, self.expanded, self.expanded / elapsed if elapsed > 0 else 0,
+            node.depth, node.state.board.free_cells,
+            "-" if frontier_size is None else frontier_size), file=self.file)
+
+
+def solve(board: Board, search: str = "dfs", branching: str = "mrv",
+          ordering: str = "least-used", cache: SolutionCache = None, progress=None,
+          budget: SearchBudget = None):
+    """Resolve um tabuleiro e devolve o tabuleiro resolvido, ou None se não
+    tiver solução. Se for dada uma cache, é consultada antes da procura e
+    atualizada depois dela. progress é passado à procura (ver
+    ProgressReporter). Se a procura esgotar o budget, é devolvido o
+    BudgetExceeded da procura."""
+    if (cache is not None):
+        solution = cache.lookup(board)
+        if (solution is not None):
+            return type(board)(solution, board.side, 0)
+
+    problem = Takuzu(board, branching, ordering)
+    options = {}
+    if (progress is not None):
+        options["progress"] = progress
+    if (budget is not None):
+        options["budget"] = budget
+    solution_node = SEARCH_STRATEGIES[search](problem, **options)
+    if (solution_node is None or isinstance(solution_node, BudgetExceeded)):
+        return solution_node
+
+    final_board = solution_node.state.board
+    if (cache is not None):
+        cache.store(board, final_board)
+    return final_board
+
+
+def read_instances(path: str):
+    """Devolve uma lista ordenada de (nome, conteúdo, conteúdo da solução
+    esperada ou None) com os ficheiros input_* de uma diretoria ou de um
+    arquivo zip. A solução esperada é o ficheiro output_* com o mesmo
+    sufixo, se existir. Só são lidos os ficheiros input_* e output_*, e o
+    seu conteúdo é devolvido em bytes, sem ser descodificado, para que um
+    ficheiro inválido só afete a sua instância. Os ficheiros do zip são
+    lidos sem serem extraídos."""
+    def wanted(name):
+        return os.path.basename(name).startswith(("input_", "output_"))
+
+    if (zipfile.is_zipfile(path)):
+        with zipfile.ZipFile(path) as archive:
+            files = {name: archive.read(name) for name in archive.namelist()
+                     if not name.endswith("/") and wanted(name)}
+    else:
+        files = {}
+        for name in os.listdir(path):
+            full_path = os.path.join(path, name)
+            if (wanted(name) and os.path.isfile(full_path)):
+                with open(full_path, "rb") as file:
+                    files[name] = file.read()
+
+    instances = []
+    for name in sorted(files):
+        directory, base = os.path.split(name)
+        if (base.startswith("input_")):
+            expected = os.path.join(directory, "output_" + base[len("input_"):])
+            instances.append((base, files[name], files.get(expected)))
+    return instances
+
+
+PORTFOLIO = [
+    ("dfs", "mrv", "least-used", 0),
+    ("inplace", "conflict", "least-used", 0),
+    ("dfs", "first", "fixed", 0),
+    ("greedy", "mrv", "least-used", 0),
+    ("inplace", "mrv", "random", 1),
+    ("inplace", "conflict", "random", 2),
+]
+
+
+def portfolio_worker(board: Board, configuration: tuple, results):
+    """Resolve o tabuleiro com uma configuração (search, branching, ordering,
+    seed) do portfolio e põe (configuração, solução ou None) em results"""
+    search, branching, ordering, seed = configuration
+    random.seed(seed)
+    final_board = solve(board, search, branching, ordering)
+    results.put((configuration, None if final_board is None else final_board.to_array()))
+
+
+def solve_portfolio(board: Board, configurations: list = PORTFOLIO):
+    """Resolve o tabuleiro com várias configurações ao mesmo tempo, uma por
+    processo, e devolve (tabuleiro resolvido ou None, configuração que acabou
+    primeiro). Como todas as procuras são completas, a primeira resposta é
+    definitiva, mesmo que seja None, e os restantes processos são terminados."""
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=portfolio_worker, args=(board, configuration, results),
+                                       daemon=True)
+               for configuration in configurations]
+    for worker in workers:
+        worker.start()
+
+    winner, solution = None, None
+    try:
+        while (winner is None):
+            try:
+                winner, solution = results.get(timeout=0.1)
+            except Empty:
+                if (not any(worker.is_alive() for worker in workers) and results.empty()):
+                    break
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+    if (solution is None):
+        return None, winner
+    return type(board)(solution, board.side, 0), winner
+
+
+def split_frontier(problem: Takuzu, depth: int):
+    """Expande o estado inicial em largura até à profundidade depth.
+    Retorna (estados objetivo encontrados pelo caminho, restantes estados
+    consistentes da última profundidade)."""
+    goals = []
+    frontier = [problem.initial]
+    for _ in range(depth):
+        children = []
+        for state in frontier:
+            if (problem.goal_test(state)):
+                goals.append(state)
+            else:
+                children.extend(problem.result(state, action)
+                                for action in problem.actions(state))
+        frontier = [state for state in children if state.consistent]
+
+    goals.extend(state for state in frontier if problem.goal_test(state))
+    return goals, [state for state in frontier if not problem.goal_test(state)]
+
+
+def explore_subtree(data: bytes, side: int, board_class, branching: str, ordering: str,
+                    max_expansions: int, limit: int):
+    """Explora a subárvore de um estado serializado com Takuzu.explore.
+    Retorna (número de soluções, primeira solução serializada ou None,
+    estados serializados por explorar). É a função executada pelos
+    processos de parallel_search."""
+    problem = Takuzu(board_class.from_bytes(data, side), branching, ordering)
+    count, solution, frontier = problem.explore(max_expansions, limit)
+    return count, (None if solution is None else solution.to_bytes()), frontier
+
+
+def parallel_search(board: Board, limit: int = 1, jobs: int = None, split_depth: int = 4,
+                    max_expansions: int = 2000, branching: str = "mrv",
+                    ordering: str = "least-used"):
+    """Procura em profundidade paralela. A raiz é expandida até split_depth
+    e os estados da fronteira são repartidos por jobs processos. Um processo
+    que não esgote a sua subárvore em max_expansions expansões devolve o que
+    lhe faltou explorar, que volta à pilha de trabalho, pelo que as
+    subárvores grandes acabam repartidas por todos os processos. A pilha é
+    servida do fim, para que a ordem se mantenha próxima da de uma procura
+    em profundidade. A procura pára ao fim de limit soluções (None: todas).
+    Retorna (número de soluções, no máximo limit, primeira solução
+    encontrada ou None)."""
+    problem = Takuzu(board, branching, ordering)
+    goals, frontier = split_frontier(problem, split_depth)
+    count = len(goals)
+    solution = goals[0].board if goals else None
+    if (limit is not None and count >= limit):
+        return limit, solution
+
+    board_class = type(board)
+    work = [state.board.to_bytes() for state in reversed(frontier)]
+    jobs = jobs or os.cpu_count()
+    executor = ProcessPoolExecutor(jobs)
+    try:
+        pending = set()
+        while work or pending:
+            while work and len(pending) < jobs:
+                remaining_limit = None if limit is None else limit - count
+                pending.add(executor.submit(explore_subtree, work.pop(), board.side, board_class,
+                                            branching, ordering, max_expansions,
+                                            remaining_limit))
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, first, remaining = future.result()
+                count += found
+                if (solution is None and first is not None):
+                    solution = board_class.from_bytes(first, board.side)
+                if (limit is not None and count >= limit):
+                    return limit, solution
+                work.extend(remaining)
+        return count, solution
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def solve_parallel(board: Board, jobs: int = None, split_depth: int = 4,
+                   max_expansions: int = 2000, branching: str = "mrv",
+                   ordering: str = "least-used"):
+    """Resolve um tabuleiro com parallel_search. Retorna o tabuleiro
+    resolvido ou None se não houver solução."""
+    _, solution = parallel_search(board, 1, jobs, split_depth, max_expansions,
+                                  branching, ordering)
+    return solution
+
+
+def count_solutions(board: Board, limit: int = None, jobs: int = 1, split_depth: int = 4,
+                    max_expansions: int = 2000, branching: str = "mrv",
+                    ordering: str = "least-used") -> int:
+    """Conta as soluções de um tabuleiro, parando ao fim de limit (todas,
+    se limit for None). Com limit=2, o resultado é 1 se e só se a solução
+    for única. Se jobs for maior que 1, a contagem é repartida por vários
+    processos com parallel_search."""
+    if (jobs is not None and jobs <= 1):
+        count, _, _ = Takuzu(board, branching, ordering).explore(limit=limit)
+        return count
+
+    count, _ = parallel_search(board, limit, jobs, split_depth, max_expansions,
+                               branching, ordering)
+    return count
+
+
+def random_solution(side: int, board_class=BitBoard) -> Board:
+    """Devolve um tabuleiro side x side completo e válido, escolhido ao acaso
+    com o gerador global do módulo random. Algumas escolhas iniciais levam a
+    procuras muito longas, por isso a procura recomeça com outras escolhas
+    sempre que passa de side * side estados expandidos."""
+    empty = board_class(np.full((side, side), 2, dtype=np.int8), side, side * side)
+    problem = Takuzu(empty, ordering="random")
+    while True:
+        _, solution, _ = problem.explore(side * side)
+        if (solution is not None):
+            return solution
+
+
+def breaks_rules(matrix, row: int, col: int) -> bool:
+    """Devolve True se o valor da célula (row, col) de uma matriz forma um
+    triplo ou excede o limite de ocorrências na sua linha ou coluna"""
+    side = len(matrix)
+    value = matrix[row, col]
+    limit = (side + 1) // 2
+    row_values = matrix[row].tolist()
+    col_values = matrix[:, col].tolist()
+    return (row_values.count(value) > limit or col_values.count(value) > limit or
+            Board.count_triples(row_values[max(0, col - 2):col + 3]) > 0 or
+            Board.count_triples(col_values[max(0, row - 2):row + 3]) > 0)
+
+
+def generate_puzzle(side: int, clues: int = None, max_branching: int = 0,
+                    min_branching: int = 0, attempts: int = 100, seed: int = None,
+                    board_class=BitBoard):
+    """Gera um puzzle com solução única. Parte de random_solution e retira
+    pistas, por ordem aleatória, até restarem clues pistas. Uma pista só é
+    retirada se a procura que prova que a solução continua única não
+    precisar de mais de max_branching estados expandidos (sem limite se for
+    None), o que controla a dificuldade e o tempo de geração. A dificuldade
+    do puzzle é o número de estados expandidos por Takuzu.explore para o
+    resolver e provar que a solução é única (0 se a propagação chegar). Se
+    ficar abaixo de min_branching, é gerado outro puzzle, até attempts
+    tentativas. Retorna (puzzle, solução, dificuldade), ou None se nenhuma
+    tentativa servir."""
+    if (seed is not None):
+        random.seed(seed)
+
+    for _ in range(attempts):
+        solution = random_solution(side, board_class)
+        matrix = solution.to_array().copy()
+        free = 0
+
+        cells = [(row, col) for row in range(side) for col in range(side)]
+        random.shuffle(cells)
+        for row, col in cells:
+            if (clues is not None and side * side - free <= clues):
+                break
+
+            # Como o puzzle atual tem solução única, qualquer outra solução
+            # do puzzle sem a pista tem o valor oposto nesta célula: basta
+            # provar que com esse valor não há solução.
+            value = matrix[row, col]
+            matrix[row, col] = 1 - value
+            if (breaks_rules(matrix, row, col)):
+                refuted = True
+            else:
+                problem = Takuzu(board_class(matrix, side, free))
+                count, _, frontier = problem.explore(max_branching)
+                refuted = count == 0 and not frontier
 
+            if (refuted):
+                matrix[row, col] = 2
+                free += 1
+            else:
+                matrix[row, col] = value
 
-    def pick_conditioned_by_adjacencies(self, row: int, col: int, board: Board) -> int:
-        vertical = board.adjacent_vertical_numbers(row, col)
-        horiz = board.adjacent_horizontal_numbers(row, col)
-        
-        horizontal_move = self.horizontal_adjacencies(row, col, horiz, board)
-        vertical_move = self.vertical_adjacencies(row, col, vertical, board)
-        
-        
-        if (horizontal_move != -1):
-            if (vertical_move == Takuzu.get_complementary_value(horizontal_move)):
-                # Kill this branch
-                return -2
-            return horizontal_move
-        elif (vertical_move != -1):
-            return vertical_move
-        
-        return -1
+        puzzle = board_class(matrix, side, free)
+        problem = Takuzu(puzzle)
+        problem.explore(limit=2)
+        if (problem.expansions >= min_branching):
+            return puzzle, solution, problem.expansions
+    return None
 
 
-    def horizontal_adjacencies(self, row: int, col: int, horiz, board: Board):
-        if (horiz[0] == horiz[1]):
-            return Takuzu.get_complementary_value(horiz[0])
-        
-        elif (not (col in (board.side - 2, board.side - 1)) and 
-              (horiz[1] == board.get_number(row, col + 2))):
-            
-            return Takuzu.get_complementary_value(horiz[1])
-        
-        elif (not (col in (0, 1)) and
-              (horiz[0] == board.get_number(row, col - 2))):
-            
-            return Takuzu.get_complementary_value(horiz[0])
-        
-        return -1
+def generate_puzzles(count: int, side: int, jobs: int = 1, seed: int = 0, **options):
+    """Gera count puzzles com generate_puzzle, repartidos por jobs processos.
+    O puzzle i usa a semente seed + i, por isso o resultado não depende de
+    jobs. Devolve os resultados de generate_puzzle pela ordem das sementes."""
+    seeds = range(seed, seed + count)
+    if (jobs <= 1):
+        return [generate_puzzle(side, seed=puzzle_seed, **options) for puzzle_seed in seeds]
 
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(generate_puzzle, side, seed=puzzle_seed, **options)
+                   for puzzle_seed in seeds]
+        return [future.result() for future in futures]
 
-    def vertical_adjacencies(self, row: int, col: int, vert, board: Board):
-        if (vert[0] == vert[1]):
-            return Takuzu.get_complementary_value(vert[0])
-        
-        elif (not (row in (0,1)) and (vert[0] == board.get_number(row - 2, col))):
-            return Takuzu.get_complementary_value(vert[0])
-        
-        elif (not (row in (board.side - 2, board.side - 1)) and 
-              (vert[1] == board.get_number(row + 2, col))):
-            return Takuzu.get_complementary_value(vert[1])
-        
-        return -1
 
-    
-    def check_num_occurences(self, board_size: int, num_occurences: int):
-        """Funcao que permite ver se o número de ocorrências de 0s ou 1s,
-        numa linha ou tabuleiro, já atingiu o limite válido. Se num_occurences
-        for a soma dos valores, permite ver se a linha/coluna está totalmente,
-        preenchida com o número certo de 0s e 1s"""
-        uneven = board_size % 2
-        
-        if (uneven):
-            return num_occurences == int(board_size / 2 + 1)
+def solve_with_timeout(board: Board, timeout: float = None, max_expansions: int = None,
+                       **options):
+    """Resolve um tabuleiro com solve, desistindo ao fim de timeout segundos
+    ou de max_expansions estados expandidos. Retorna (solução como matriz de
+    int8 ou None, tempo gasto, None ou o motivo da desistência, 'deadline'
+    ou 'expansions'). É a função executada pelos processos de solve_batch."""
+    start = time.perf_counter()
+    budget = None
+    if (timeout is not None or max_expansions is not None):
+        budget = SearchBudget(max_expansions, timeout)
+
+    final_board = solve(board, budget=budget, **options)
+    if (isinstance(final_board, BudgetExceeded)):
+        return None, time.perf_counter() - start, final_board.reason
+
+    solution = None if final_board is None else final_board.to_array()
+    return solution, time.perf_counter() - start, None
+
+
+class BoardWriter:
+    """Acumula tabuleiros no formato de saída e escreve-os todos com uma
+    única escrita, no ficheiro path ou, se não for dado, no stdout"""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.chunks = []
+
+
+    def write(self, board: Board, header: bool = False):
+        """Acrescenta um tabuleiro, precedido do seu tamanho se header for
+        True (o formato de entrada)"""
+        if (header):
+            self.chunks.append(b"%d\n" % board.side)
+        self.chunks.append(board.format_bytes())
+
+
+    def write_line(self, line: str):
+        """Acrescenta uma linha de texto, como o nome de uma instância"""
+        self.chunks.append(line.encode() + b"\n")
+
+
+    def close(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        if (self.path is not None):
+            with open(self.path, "wb") as file:
+                file.write(data)
         else:
-            return num_occurences == int(board_size / 2)
-    
-    
-    def pick_conditioned_by_number_of_occurences(self, row: int, col: int, board: Board):
-
-        num_0_row = 0
-        num_1_row = 0
-        num_0_col = 0
-        num_1_col = 0
-        for i in range(board.side):
-            row_val = board.get_number(row, i)
-            col_val = board.get_number(i, col)
-            if (row_val == 0):
-                num_0_row += 1
-            elif (row_val == 1):
-                num_1_row += 1
-            if (col_val == 0):
-                num_0_col += 1
-            elif (col_val == 1):
-                num_1_col += 1
-
-        valid_row_0 = self.check_num_occurences(board.side, num_0_row)
-        valid_row_1 = self.check_num_occurences(board.side, num_1_row)
-        valid_col_0 = self.check_num_occurences(board.side, num_0_col)
-        valid_col_1 = self.check_num_occurences(board.side, num_1_col)
-
-        if (num_0_row > num_1_row and valid_row_0):
-            if (num_1_col > num_0_col and valid_col_1):
-                return -2
-            return 1
-        elif (num_1_row > num_0_row and valid_row_1):
-            if (num_0_col > num_1_col and valid_col_0):
-                return -2
-            return 0
-        if (num_0_col > num_1_col and valid_col_0):
-            return 1
-        elif (num_1_col > num_0_col and valid_col_1):
-            return 0
-
-
-        return -1
-
-
-    def check_equal_lines(self, board: Board):
-        size = board.side
-        
-        for row_1 in range(size):
-            for row_2 in range(row_1 + 1, size):
-                col_equalities = 0
-                row_equalities = 0
-                
-                
-                for i in range(size):
-                    if (board.get_number(row_1, i) == board.get_number(row_2, i)):
-                        row_equalities += 1
-                    if (board.get_number(i, row_1) == board.get_number(i, row_2)):
-                        col_equalities += 1
-
-                    if (row_equalities == size or col_equalities == size):
-                        return False
-        
-        return True
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+
+def solve_batch(path: str, board_class=BitBoard, output_dir: str = None,
+                check: bool = False, report=sys.stderr, jobs: int = 1,
+                timeout: float = None, ordered: bool = True,
+                cache: SolutionCache = None, output: str = None,
+                max_expansions: int = None, **options):
+    """Resolve todas as instâncias de read_instances(path), distribuídas
+    por jobs processos. As soluções são escritas em output_dir (com o nome
+    output_<sufixo>) ou, se não for dado, com um BoardWriter no ficheiro
+    output ou no stdout, pela ordem dos ficheiros ou, se ordered for False,
+    pela ordem em que ficam resolvidas. No BoardWriter, cada instância
+    começa por uma linha com o seu nome e estado, seguida da solução se
+    houver, para que as instâncias que falham não desalinhem as restantes
+    nem seja preciso saber a ordem. Para cada instância é escrita em
+    report uma linha com o tempo de resolução e, se check for True, o
+    resultado da comparação com a solução esperada. Cada instância tem no
+    máximo timeout segundos e max_expansions expansões. Uma instância mal
+    formada é reportada como erro e não interrompe as restantes. A cache é
+    consultada e atualizada apenas por este processo. As restantes opções
+    são passadas a solve. Retorna o número de instâncias mal formadas, sem
+    solução, fora de tempo ou com uma solução diferente da esperada."""
+    instances = read_instances(path)
+    boards = []
+    errors = {}
+    for index, (_, data, _) in enumerate(instances):
+        try:
+            boards.append(board_class.parse_instance(data.decode()))
+        except ValueError as error:
+            boards.append(None)
+            errors[index] = error
+    failures = 0
+
+    writer = None
+    if (output_dir is not None):
+        os.makedirs(output_dir, exist_ok=True)
+    else:
+        writer = BoardWriter(output)
+
+    def finish(index, solution, elapsed, exceeded):
+        nonlocal failures
+        name, _, expected = instances[index]
+        board = boards[index]
+        if (board is None):
+            status = "parse error: {}".format(errors[index])
+            print("{}\t-\t{}".format(name, status), file=report)
+            failures += 1
+            if (writer is not None):
+                writer.write_line("{}\t{}".format(name, status))
+            return
+
+        final_board = None if solution is None else board_class(solution, board.side, 0)
+        if (cache is not None and final_board is not None):
+            cache.store(board, final_board)
+
+        output = b"" if final_board is None else final_board.format_bytes()
+        if (exceeded is not None):
+            status = "timeout" if exceeded == "deadline" else "budget exceeded"
+            failures += 1
+        elif (final_board is None):
+            status = "no solution"
+            failures += 1
+        elif (not check):
+            status = "solved"
+        elif (expected is None):
+            status = "solved (no expected output)"
+        elif (output.split() == expected.split()):
+            status = "OK"
+        else:
+            status = "DIFF"
+            failures += 1
+        print("{}\t{:.1f}ms\t{}".format(name, elapsed * 1000, status), file=report)
+
+        if (output_dir is not None):
+            with open(os.path.join(output_dir, "output_" + name[len("input_"):]), "wb") as file:
+                file.write(output)
+        else:
+            writer.write_line("{}\t{}".format(name, status))
+            if (final_board is not None):
+                writer.write(final_board)
+
+    start = time.perf_counter()
+    # Resultados conhecidos sem procura: instâncias mal formadas e soluções
+    # que já estão na cache.
+    ready = {index: (None, 0, None) for index in errors}
+    if (cache is not None):
+        for index, board in enumerate(boards):
+            if (board is None):
+                continue
+            solution = cache.lookup(board)
+            if (solution is not None):
+                ready[index] = (solution, 0, None)
+    pending = [index for index in range(len(boards)) if index not in ready]
+
+    if (jobs <= 1):
+        for index in range(len(boards)):
+            if (index in ready):
+                finish(index, *ready[index])
+            else:
+                finish(index, *solve_with_timeout(boards[index], timeout, max_expansions,
+                                                  **options))
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            futures = {executor.submit(solve_with_timeout, boards[index], timeout,
+                                       max_expansions, **options): index
+                       for index in pending}
+            if (ordered):
+                results = {index: future for future, index in futures.items()}
+                for index in range(len(boards)):
+                    finish(index, *(ready[index] if index in ready else results[index].result()))
+            else:
+                for index in ready:
+                    finish(index, *ready[index])
+                for future in as_completed(futures):
+                    finish(futures[future], *future.result())
+
+    if (writer is not None):
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print("total\t{:.1f}ms\t{} failed\t{:.1f} puzzles/s".format(
+        elapsed * 1000, failures, len(instances) / elapsed if elapsed > 0 else 0), file=report)
+    return failures
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve um tabuleiro de Takuzu lido do stdin.")
+    parser.add_argument("--backend", choices=sorted(BOARD_BACKENDS), default="bits",
+                        help="representação interna do tabuleiro (default: bits)")
+    parser.add_argument("--search", choices=sorted(SEARCH_STRATEGIES), default="dfs",
+                        help="algoritmo de procura a usar (default: dfs)")
+    parser.add_argument("--branching", choices=sorted(BRANCHING_STRATEGIES), default="mrv",
+                        help="célula em que se ramifica quando não há jogadas forçadas "
+                             "(default: mrv)")
+    parser.add_argument("--ordering", choices=sorted(VALUE_ORDERINGS), default="least-used",
+                        help="ordem pela qual se experimentam os valores (default: least-used)")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="base de dados SQLite com soluções já encontradas")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="número máximo de soluções na cache (default: 10000)")
+    parser.add_argument("--cache-stats", action="store_true",
+                        help="escreve no stderr os hits e misses da cache")
+    parser.add_argument("--batch", metavar="DIR|ZIP",
+                        help="resolve todos os ficheiros input_* de uma diretoria ou zip")
+    parser.add_argument("--output-dir", metavar="DIR",
+                        help="no modo batch, diretoria onde escrever os output_* "
+                             "(default: stdout, com o nome e o estado de cada instância "
+                             "antes da sua solução)")
+    parser.add_argument("--check", action="store_true",
+                        help="no modo batch, compara cada solução com o output_* respetivo")
+    parser.add_argument("--output", metavar="FILE",
+                        help="ficheiro onde escrever as soluções ou os puzzles gerados "
+                             "(default: stdout)")
+    parser.add_argument("--jobs", type=int,
+                        help="número de processos a usar no modo batch (default: 1) ou "
+                             "com --parallel (default: um por CPU)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="tempo máximo da procura de cada instância")
+    parser.add_argument("--max-expansions", type=int, metavar="N",
+                        help="número máximo de estados expandidos pela procura de cada "
+                             "instância")
+    parser.add_argument("--unordered", action="store_true",
+                        help="no modo batch, escreve as soluções pela ordem em que "
+                             "ficam resolvidas")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="corre em paralelo as configurações de PORTFOLIO e usa a "
+                             "primeira que acabar (ignora --search, --branching e --ordering)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="procura em profundidade repartida por --jobs processos "
+                             "(ignora --search)")
+    parser.add_argument("--split-depth", type=int, default=4,
+                        help="com --parallel, profundidade até onde a raiz é expandida "
+                             "antes de repartir o trabalho (default: 4)")
+    parser.add_argument("--count", action="store_true",
+                        help="escreve o número de soluções em vez de uma solução")
+    parser.add_argument("--count-limit", type=int, metavar="N",
+                        help="com --count, pára ao fim de N soluções (2 verifica se a "
+                             "solução é única)")
+    parser.add_argument("--progress", type=float, nargs="?", const=1.0, metavar="SECONDS",
+                        help="escreve no stderr o progresso da procura a cada SECONDS "
+                             "segundos (default: 1)")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="gera N puzzles com solução única e escreve-os no stdout, "
+                             "no formato de entrada")
+    parser.add_argument("--size", type=int, default=14,
+                        help="com --generate, tamanho dos puzzles (default: 14)")
+    parser.add_argument("--clues", type=int,
+                        help="com --generate, número de pistas a manter (default: o mínimo "
+                             "que se conseguir)")
+    parser.add_argument("--max-branching", type=int, default=0,
+                        help="com --generate, estados que a prova de unicidade pode expandir "
+                             "ao retirar cada pista; valores maiores dão puzzles mais "
+                             "difíceis (default: 0)")
+    parser.add_argument("--min-branching", type=int, default=0,
+                        help="com --generate, dificuldade mínima de cada puzzle (default: 0)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="com --generate, semente do primeiro puzzle (default: 0)")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    
-    board = Board.parse_instance_from_stdin()
-    problem = Takuzu(board)
-
-    solution_node = depth_first_tree_search(problem)
-    #solution_node = greedy_search(problem)
-    if (solution_node != None):
-        solution_state = solution_node.state
-        final_board = solution_state.board
-        print(final_board)
+    args = parse_arguments()
+    cache = SolutionCache(args.cache, args.cache_size) if args.cache else None
+    failures = 0
+
+    if (args.generate):
+        puzzles = generate_puzzles(args.generate, args.size, args.jobs or 1, args.seed,
+                                   clues=args.clues, max_branching=args.max_branching,
+                                   min_branching=args.min_branching,
+                                   board_class=BOARD_BACKENDS[args.backend])
+        writer = BoardWriter(args.output)
+        for index, generated in enumerate(puzzles):
+            if (generated is None):
+                print("puzzle {}: min-branching not reached".format(index), file=sys.stderr)
+                failures += 1
+                continue
+            puzzle, _, difficulty = generated
+            writer.write(puzzle, header=True)
+            print("puzzle {}: {} clues, difficulty {}".format(
+                index, puzzle.side * puzzle.side - puzzle.free_cells, difficulty), file=sys.stderr)
+        writer.close()
+    elif (args.batch):
+        failures = solve_batch(args.batch, BOARD_BACKENDS[args.backend], args.output_dir,
+                               args.check, jobs=args.jobs or 1, timeout=args.timeout,
+                               ordered=not args.unordered, cache=cache, output=args.output,
+                               max_expansions=args.max_expansions, search=args.search,
+                               branching=args.branching, ordering=args.ordering)
+    else:
+        writer = BoardWriter(args.output)
+        boards = BOARD_BACKENDS[args.backend].parse_instances_from_stdin()
+        index = 0
+        try:
+            while (True):
+                # Depois de uma instância mal formada já não se sabe onde
+                # começa a seguinte, por isso a leitura termina aí.
+                try:
+                    board = next(boards)
+                except StopIteration:
+                    break
+                except ValueError as error:
+                    print("instância {}: parse error: {}".format(index + 1, error),
+                          file=sys.stderr)
+                    failures += 1
+                    break
+                index += 1
+
+                if (args.count):
+                    print(count_solutions(board, args.count_limit, args.jobs or 1, args.split_depth,
+                                          branching=args.branching, ordering=args.ordering))
+                    final_board = None
+                elif (args.portfolio):
+                    final_board = cache.lookup(board) if cache is not None else None
+                    if (final_board is not None):
+                        final_board = type(board)(final_board, board.side, 0)
+                    else:
+                        final_board, winner = solve_portfolio(board)
+                        print("portfolio: {} {} {} seed={}".format(*winner), file=sys.stderr)
+                        if (cache is not None and final_board is not None):
+                            cache.store(board, final_board)
+                elif (args.parallel):
+                    final_board = solve_parallel(board, args.jobs, args.split_depth,
+                                                 branching=args.branching, ordering=args.ordering)
+                else:
+                    progress = ProgressReporter(args.progress) if args.progress else None
+                    budget = None
+                    if (args.timeout is not None or args.max_expansions is not None):
+                        budget = SearchBudget(args.max_expansions, args.timeout)
+                    final_board = solve(board, args.search, args.branching, args.ordering, cache,
+                                        progress, budget)
+                    if (isinstance(final_board, BudgetExceeded)):
+                        print(final_board, file=sys.stderr)
+                        failures += 1
+                        final_board = None
+                if (final_board != None):
+                    writer.write(final_board)
+        finally:
+            writer.close()
+
+    if (cache is not None):
+        if (args.cache_stats):
+            print(cache.stats(), file=sys.stderr)
+        cache.close()
+
+    sys.exit(1 if failures else 0)
@@ -5,6 +5,7 @@ import collections
 import collections.abc
 import functools
 import heapq
+import itertools
 import operator
 import os.path
 import random
@@ -724,10 +725,13 @@ class PriorityQueue:
     order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
+    Items with the same f(x) are returned in insertion order, using a
+    sequence number owned by the queue, so items never need to be comparable.
     Also supports dict-like lookup."""
 
     def __init__(self, order='min', f=lambda x: x):
         self.heap = []
+        self.counter = itertools.count()
         if order == 'min':
             self.f = f
         elif order == 'max':  # now item with max f(x)
@@ -737,7 +741,7 @@ class PriorityQueue:
 
     def append(self, item):
         """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        heapq.heappush(self.heap, (self.f(item), next(self.counter), item))
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -748,7 +752,7 @@ class PriorityQueue:
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
         if self.heap:
-            return heapq.heappop(self.heap)[1]
+            return heapq.heappop(self.heap)[2]
         else:
             raise Exception('Trying to pop from empty PriorityQueue.')
 
@@ -758,12 +762,12 @@ class PriorityQueue:
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return any([item == key for _, _, item in self.heap])
 
     def __getitem__(self, key):
         """Returns the first value associated with key in PriorityQueue.
         Raises KeyError if key is not present."""
-        for value, item in self.heap:
+        for value, _, item in self.heap:
             if item == key:
                 return value
         raise KeyError(str(key) + " is not in the priority queue")
@@ -771,7 +775,7 @@ class PriorityQueue:
     def __delitem__(self, key):
         """Delete the first occurrence of key."""
         try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
+            del self.heap[[item == key for _, _, item in self.heap].index(True)]
         except ValueError:
             raise KeyError(str(key) + " is not in the priority queue")
         heapq.heapify(self.heap)